@@ -1,7 +1,10 @@
+import atexit
 import functools
+import glob
 import itertools
 import json
 import math
+import multiprocessing
 import sys
 import threading
 import os
@@ -9,11 +12,21 @@ import time
 from datetime import datetime
 from typing import Any
 
+STARTUP_TIMING = bool(os.environ.get('HACK_STARTUP_TIMING'))
+_import_start = time.perf_counter()
+
 from game.engine import gfx
 from moderngl_window.context.base import KeyModifiers
 
 from game.engine.gfx import BaseDrawParams, IterableParams
 
+from hack.snapshot_gc import SnapshotGC
+from hack.submit import Submitter
+from hack.channel import UpdateChannel
+from hack.tick_index import TickIndex
+from hack.ghost import Ghost
+from hack.heatmap import CELL, KINDS, build_heatmaps, to_rgba
+
 
 def inject_class(cls):
     assert len(cls.__bases__) == 1
@@ -33,49 +46,127 @@ gui_obj: 'HackedHackceler8' = None
 # toolbox window
 class Toolbox:
     SAVE_LOC = 'replays'
+    # HACK_NO_QT: overlays and sim keys only, no toolbox window; search workers never start one either
+    HEADLESS = bool(os.environ.get('HACK_NO_QT')) or multiprocessing.parent_process() is not None
 
     def __init__(self):
-        autosave_loc = os.path.join(Toolbox.SAVE_LOC, 'autosave')
-        os.makedirs(autosave_loc, exist_ok=True)
-        self.save_file = open(
-            os.path.join(autosave_loc, f'{datetime.now().strftime("%d-%H-%M-%S-%f")}.jsonl'), 'wb')
-
+        self.__save_file = None
+        self.__save_lock = threading.Lock()
         self.is_sim = False
         self.__game_snapshot = None
+        self.__has_snapshot = False
         self.__snapshot_index = 0
         self.__sub_msgs = []
         self.__unsub_msgs = []
         self.pending_replays = []
+        self.pending_seek = None
+        self.pending_query = None
+        self.pending_diff = False
         self.replay_realtime = True
         self.window = None
+        self.unfocus_func = None
         self.should_show_extra_info = False
+        self.turbo = False
+        self.gc = SnapshotGC()
+        self.index = TickIndex()
+        self.ghost = None
+        self.show_ghost = True
+        self.heatmaps = None
+        self.heatmap_kind = None
+        self.__ghost_executor = None
+        self.__replay_executor = None
+        self.submitter = None
+        self.__submit_progress = None
+
+        self.pending_sim = None
+        self.search = None
+        self.pending_search = None
+        self.__sub_keys = []
+        # resumed on the game thread, which can read the state the server restored
+        self.pending_resume = bool(os.environ.get('HACK_RESUME'))
+        # nothing drains it without the window
+        self.ui = UpdateChannel(enabled=not Toolbox.HEADLESS)
+        # the game thread's copy, the widget only catches up at the next drain
+        self.__play_state = 'play' if Toolbox.HEADLESS else 'pause'
+
+        # the Qt window is only started on first use, after the game window is up
+        self.thread = None
 
-        self.lock = threading.Lock()
+    @property
+    def save_file(self):
+        # first reached from either the game or the Qt thread, only one of them opens it
+        with self.__save_lock:
+            if self.__save_file is None:
+                autosave_loc = os.path.join(Toolbox.SAVE_LOC, 'autosave')
+                os.makedirs(autosave_loc, exist_ok=True)
+                self.__save_file = open(
+                    os.path.join(autosave_loc, f'{datetime.now().strftime("%d-%H-%M-%S-%f")}.jsonl'), 'wb')
+            return self.__save_file
+
+    @staticmethod
+    def __boundary_path(path):
+        return path.removesuffix('.jsonl') + '.sub'
+
+    def __mark_submitted(self, loc):
+        # the autosave past loc holds sim ticks the server never saw
+        with open(Toolbox.__boundary_path(self.save_file.name), 'w') as f:
+            f.write(str(loc))
+
+    @staticmethod
+    def __submitted_size(path):
+        try:
+            with open(Toolbox.__boundary_path(path)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
 
+    def show_window(self):
+        if self.thread is not None or Toolbox.HEADLESS:
+            return
         self.thread = threading.Thread(target=self.__start_window, daemon=True)
         self.thread.start()
 
+    @property
+    def sim_index(self):
+        return self.__snapshot_index
+
+    def record_tick(self, game):
+        if self.__snapshot_index + 1 < self.index.length:
+            # branching off after a rewind: keep the abandoned path as the ghost
+            try:
+                self.ghost = Ghost.from_index(self.index, self.__snapshot_index)
+            except ValueError:
+                # no player was ever recorded, the ghost stays as it was
+                pass
+        self.index.record(self.__snapshot_index, game)
+
     def has_pending_unsub(self):
         return len(self.__unsub_msgs) > 0
 
     def set_snapshot(self, snapshot):
-        assert self.__game_snapshot is None and snapshot is not None
+        # None marks a tick that can't be undone to (e.g. mid screen fade)
+        assert not self.__has_snapshot
         self.__game_snapshot = snapshot
+        self.__has_snapshot = True
 
     def enqueue_msg(self, msg):
+        self.gc.tick()
         if not self.is_sim:
             loc = self.save_file.tell()
-            self.save_file.write(msg)
-            self.save_file.write(b'\n')
+            self.save_file.write(msg + b'\n')
+            # the process exits through os._exit, so nothing buffered may be left behind
+            self.save_file.flush()
             self.__sub_msgs.append((loc, msg))
-            self.window.counter.set_tick(len(self.__sub_msgs))
+            self.ui.set('set_tick', len(self.__sub_msgs))
             return True
 
-        assert self.__game_snapshot is not None
+        assert self.__has_snapshot
         snapshot, self.__game_snapshot = self.__game_snapshot, None
+        self.__has_snapshot = False
 
         if self.__snapshot_index != len(self.__unsub_msgs):
             loc = self.__unsub_msgs[self.__snapshot_index][0]
+            self.gc.released(s for _, s, _ in self.__unsub_msgs[self.__snapshot_index:])
             self.__unsub_msgs = self.__unsub_msgs[:self.__snapshot_index]
 
             self.save_file.truncate(loc)
@@ -83,27 +174,74 @@ class Toolbox:
         else:
             loc = self.save_file.tell()
 
-        self.save_file.write(msg)
-        self.save_file.write(b'\n')
+        self.save_file.write(msg + b'\n')
+        self.save_file.flush()
 
         self.__unsub_msgs.append((loc, snapshot, msg))
         self.__snapshot_index = len(self.__unsub_msgs)
+        if snapshot is not None:
+            self.gc.captured()
+
+        self.ui.set('set_tick', len(self.__sub_msgs), self.__snapshot_index, len(self.__unsub_msgs))
+        self.ui.set('counter.set_gc', *self.gc.stats())
 
-        self.window.counter.set_tick(len(self.__sub_msgs), self.__snapshot_index, len(self.__unsub_msgs))
+    def __seek_snapshot(self, indices):
+        for index in indices:
+            snapshot = self.__unsub_msgs[index][1]
+            if snapshot is not None:
+                self.__snapshot_index = index
+                self.ui.set('set_tick', len(self.__sub_msgs), self.__snapshot_index, len(self.__unsub_msgs))
+                return snapshot
 
     def undo_one(self):
-        if self.__snapshot_index <= 0:
-            return
-        self.__snapshot_index -= 1
-        self.window.counter.set_tick(len(self.__sub_msgs), self.__snapshot_index, len(self.__unsub_msgs))
-        return self.__unsub_msgs[self.__snapshot_index][1]
+        return self.__seek_snapshot(range(self.__snapshot_index - 1, -1, -1))
 
     def redo_one(self):
-        if self.__snapshot_index + 1 >= len(self.__unsub_msgs):
-            return
-        self.__snapshot_index += 1
-        self.window.counter.set_tick(len(self.__sub_msgs), self.__snapshot_index, len(self.__unsub_msgs))
-        return self.__unsub_msgs[self.__snapshot_index][1]
+        return self.__seek_snapshot(range(self.__snapshot_index + 1, len(self.__unsub_msgs)))
+
+    def request_seek(self, index):
+        self.pending_seek = index
+
+    def seek(self, index):
+        # nearest keyframe at or before index, and the messages to re-simulate from it
+        index = max(0, min(index, len(self.__unsub_msgs)))
+        for keyframe in range(min(index, len(self.__unsub_msgs) - 1), -1, -1):
+            snapshot = self.__unsub_msgs[keyframe][1]
+            if snapshot is not None:
+                break
+        else:
+            return None
+        self.__snapshot_index = index
+        self.ui.set('set_tick', len(self.__sub_msgs), self.__snapshot_index, len(self.__unsub_msgs))
+        return keyframe, snapshot, [msg for _, _, msg in self.__unsub_msgs[keyframe:index]]
+
+    def replace_keyframe(self, index, snapshot):
+        loc, old, msg = self.__unsub_msgs[index]
+        self.__unsub_msgs[index] = loc, snapshot, msg
+        self.gc.released([old])
+        self.gc.captured()
+
+    def messages(self):
+        for _, msg in self.__sub_msgs:
+            yield msg
+        for _, _, msg in self.__unsub_msgs[:self.__snapshot_index]:
+            yield msg
+
+    @property
+    def position(self):
+        return len(self.__sub_msgs), self.__snapshot_index
+
+    def key_prefix(self):
+        # keys of every message so far, submitted ones parsed only once
+        for _, msg in self.__sub_msgs[len(self.__sub_keys):]:
+            self.__sub_keys.append(json.loads(msg)['keys'])
+        return self.__sub_keys + [json.loads(msg)['keys'] for _, _, msg in self.__unsub_msgs[:self.__snapshot_index]]
+
+    def __write_messages(self, filename, extra=()):
+        with open(os.path.join(Toolbox.SAVE_LOC, filename), 'wb') as f:
+            for msg in itertools.chain(self.messages(), extra):
+                f.write(msg)
+                f.write(b'\n')
 
     def save_messages(self):
         filename = self.window.save.input.text().strip()
@@ -112,13 +250,10 @@ class Toolbox:
         else:
             filename = f'{datetime.now().strftime("%d-%H-%M-%S-%f")}.jsonl'
 
-        with open(os.path.join(Toolbox.SAVE_LOC, filename), 'wb') as f:
-            for _, msg in self.__sub_msgs:
-                f.write(msg)
-                f.write(b'\n')
-            for _, _, msg in self.__unsub_msgs[:self.__snapshot_index]:
-                f.write(msg)
-                f.write(b'\n')
+        self.__write_messages(filename)
+
+    def save_search(self, msgs):
+        self.__write_messages(f'search.{datetime.now().strftime("%d-%H-%M-%S-%f")}.jsonl', msgs)
 
     def submit_unsubs(self):
         buf = self.__unsub_msgs[:self.__snapshot_index]
@@ -129,87 +264,334 @@ class Toolbox:
             self.__sub_msgs.append((loc, msg))
 
         self.__unsub_msgs = self.__unsub_msgs[self.__snapshot_index:]
+        self.__mark_submitted(self.__unsub_msgs[0][0] if self.__unsub_msgs else self.save_file.tell())
+        self.index.drop_front(self.__snapshot_index)
         self.__snapshot_index = 0
-        self.window.counter.set_tick(len(self.__sub_msgs), 0, len(self.__unsub_msgs))
+        self.gc.released((s for _, s, _ in buf), oldest=True)
+        self.ui.set('set_tick', len(self.__sub_msgs), 0, len(self.__unsub_msgs))
 
         return ret
 
+    def send(self, net, msgs):
+        # every real send goes through one background sender so ordering is kept
+        if self.submitter is None or self.submitter.net is not net:
+            if self.submitter is not None:
+                dropped = self.submitter.close()
+                if dropped:
+                    self.set_status(f'Reconnected: {dropped} messages to the old connection were dropped')
+            self.submitter = Submitter(net)
+        self.submitter.submit(msgs)
+
+    def update_submit_progress(self):
+        if self.submitter is None:
+            return False
+        if self.submitter.error is not None:
+            # raised once; the next send starts a new sender
+            error, self.submitter = self.submitter.error, None
+            raise error
+        progress = self.submitter.sent, self.submitter.total
+        if progress != self.__submit_progress:
+            self.__submit_progress = progress
+            self.set_status(f'Submitted {progress[0]}/{progress[1]}')
+        return self.submitter.busy
+
     def replay(self, realtime):
-        if self.pending_replays:
-            return
-        if self.is_sim:
-            return
         current = self.window.replay.list.currentItem()
         if current is None:
             return
+        self.__load_replay(os.path.join(Toolbox.SAVE_LOC, current.text() + '.jsonl'), realtime)
+
+    def __load_replay(self, path, realtime, state=None, latest=False):
+        # with messages already sent, continues after the last one; else from the message sent at state, if given.
+        # A state that repeats matches its first message, or its last one if latest
+        if self.pending_replays:
+            return False
+        if self.is_sim:
+            return False
         replays = []
-        with open(os.path.join(Toolbox.SAVE_LOC, current.text() + '.jsonl'), 'rb') as f:
-            for l in f:
-                replays.append(json.loads(l))
-        if self.__sub_msgs:
-            _, last_msg = self.__sub_msgs[-1]
-            last_msg = json.loads(last_msg)
-            last_state = last_msg['state']
-            while replays:
-                top = replays.pop(0)
-                if top['state'] == last_state:
+        with open(path, 'rb') as f:
+            # an autosave left in sim mode ends with ticks that were never submitted
+            size = Toolbox.__submitted_size(path)
+            for l in (f.read() if size is None else f.read(size)).splitlines():
+                try:
+                    replays.append(json.loads(l))
+                except json.JSONDecodeError:
+                    # last line of a session that died mid-write
                     break
+        if self.__sub_msgs:
+            state, skip = json.loads(self.__sub_msgs[-1][1])['state'], 1
+        else:
+            skip = 0
+        if state is not None:
+            matches = [i for i, msg in enumerate(replays) if msg['state'] == state]
+            if not matches:
+                self.set_status(f'Nothing in {os.path.basename(path)} matches the server state')
+                return False
+            replays = replays[(matches[-1] if latest else matches[0]) + skip:]
         self.pending_replays = replays
         self.replay_realtime = realtime
+        return True
+
+    def latest_autosave(self):
+        current = self.__save_file.name if self.__save_file is not None else None
+        files = [
+            f for f in glob.iglob(os.path.join(Toolbox.SAVE_LOC, 'autosave', '*.jsonl'))
+            if f != current and os.path.getsize(f) > 0
+        ]
+        return max(files, key=os.path.getmtime, default=None)
+
+    def request_resume(self):
+        self.pending_resume = True
+
+    def resume(self, state):
+        # fast-forward through the newest previous session, from where the server already is
+        path = self.latest_autosave()
+        if path is None:
+            self.set_status('No autosave to resume')
+            return
+        # only submitted ticks are read, so the last match is the one the server stopped at
+        if self.__load_replay(path, realtime=False, state=state, latest=True):
+            self.set_status(f'Resuming {os.path.basename(path)}: {len(self.pending_replays)} ticks')
+
+    def set_status(self, text):
+        self.ui.set('status.setText', text)
+
+    @staticmethod
+    def __extra_items():
+        # the game's extra items, for simulations run off the game thread
+        if gui_obj is None:
+            return ()
+        return getattr(gui_obj.argv, 'extra_items', None) or ()
+
+    @staticmethod
+    def __process_pool(pool):
+        # one spawned worker process, started on first use
+        if pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'))
+        return pool
+
+    def process_replay(self, minimize):
+        from hack.optimizer import optimize_replay, minimize_replay
+
+        current = self.window.replay.list.currentItem()
+        if current is None:
+            return
+        self.__replay_executor = Toolbox.__process_pool(self.__replay_executor)
+        name = current.text()
+        verb = 'Trimming' if minimize else 'Optimizing'
+        future = self.__replay_executor.submit(
+            minimize_replay if minimize else optimize_replay,
+            os.path.join(Toolbox.SAVE_LOC, name + '.jsonl'), Toolbox.__extra_items())
+        future.add_done_callback(functools.partial(self.__replay_processed, verb, name))
+        self.set_status(f'{verb} {name}...')
+
+    def __replay_processed(self, verb, name, future):
+        if future.exception() is not None:
+            self.set_status(f'{verb} {name} failed: {future.exception()}')
+            return
+        dst, before, after, stopped, elapsed = future.result()
+        text = f'{verb} {name} done in {elapsed:.1f}s: {before} -> {after} ticks in {os.path.basename(dst)}'
+        if stopped is not None:
+            text += f' (only the first {stopped}: the replay waits for the server there)'
+        self.set_status(text)
+
+    def request_query(self):
+        text = self.window.query.input.text().strip()
+        if text:
+            self.pending_query = text
+
+    def run_query(self):
+        # on the game thread, which is the one growing the index
+        text, self.pending_query = self.pending_query, None
+        if text is None:
+            return
+        try:
+            ticks = self.index.query(text)
+        except ValueError as e:
+            self.set_status(str(e))
+            return
+        ranges = TickIndex.ranges(ticks)
+        self.ui.set('query.set_results', ranges)
+        self.set_status(f'{len(ticks)} ticks in {len(ranges)} ranges')
+
+    def load_ghost(self):
+        from hack.ghost import build_ghost
+
+        current = self.window.replay.list.currentItem()
+        if current is None:
+            return
+        self.__ghost_executor = Toolbox.__process_pool(self.__ghost_executor)
+        name = current.text()
+        future = self.__ghost_executor.submit(
+            build_ghost, os.path.join(Toolbox.SAVE_LOC, name + '.jsonl'), Toolbox.__extra_items())
+        future.add_done_callback(functools.partial(self.__ghost_loaded, name))
+        self.set_status(f'Simulating ghost of {name}...')
+
+    def __ghost_loaded(self, name, future):
+        if future.exception() is not None:
+            self.set_status(f'Ghost of {name} failed: {future.exception()}')
+            return
+        self.ghost = future.result()
+        self.set_status(f'Ghost of {name}: {len(self.ghost.points)} ticks')
+
+    def set_heatmap_kind(self, kind):
+        self.heatmap_kind = kind if kind in KINDS else None
+
+    def heatmap(self, current_map):
+        if self.heatmaps is None or self.heatmap_kind is None:
+            return None
+        return self.heatmaps.get(current_map, {}).get(self.heatmap_kind)
+
+    def build_heatmap(self):
+        extra_items = Toolbox.__extra_items()
+
+        def run():
+            start = time.perf_counter()
+            try:
+                self.heatmaps = build_heatmaps(Toolbox.SAVE_LOC, extra_items)
+            except Exception as e:
+                self.set_status(f'Heatmap failed: {e}')
+                return
+            self.set_status(f'Heatmap of {len(self.heatmaps)} maps in {time.perf_counter() - start:.1f}s')
+
+        threading.Thread(target=run, daemon=True).start()
+        self.set_status('Building heatmap...')
+
+    def request_diff(self):
+        self.pending_diff = True
+
+    def diff_ticks(self):
+        # on the game thread, which is the one dropping snapshots; the two stored ones at or before the sim position
+        if not self.pending_diff:
+            return
+        self.pending_diff = False
+        found = []
+        for index in range(min(self.__snapshot_index, len(self.__unsub_msgs) - 1), -1, -1):
+            snapshot = self.__unsub_msgs[index][1]
+            if snapshot is not None:
+                found.append((index, snapshot))
+                if len(found) == 2:
+                    break
+        if len(found) < 2:
+            self.set_status('Diff needs two recorded sim ticks')
+            return
+
+        (new_index, new), (old_index, old) = found
+        start = time.perf_counter()
+        changes = GameBackup.diff_snapshots(old, new)
+        self.ui.set(
+            'diff.set_rows', [f'{path}: {GameBackup.describe(a)} -> {GameBackup.describe(b)}' for path, a, b in changes])
+        count = f'first {DIFF_LIMIT} changes shown' if len(changes) >= DIFF_LIMIT else f'{len(changes)} changes'
+        self.set_status(
+            f'Tick {old_index} -> {new_index}: {count} in {(time.perf_counter() - start) * 1000:.0f}ms')
 
     def stop_replay(self):
         self.pending_replays = []
 
     def __start_window(self):
+        start = time.perf_counter()
         from hack.toolbox_gui import ToolboxWidget
-        from PySide6 import QtWidgets
+        from PySide6 import QtWidgets, QtCore
 
         app = QtWidgets.QApplication()
-        self.window = ToolboxWidget()
+        window = ToolboxWidget()
+        window.unfocus_func = self.unfocus_func
 
         # connections
-        self.window.save.save_button.clicked.connect(self.save_messages)
-
-        self.window.play.stopReplay.connect(self.stop_replay)
-        self.window.play.speed_txt.valueChanged.connect(self.speed_update)
-        self.speed_update(self.window.play.speed_txt.value())
-        self.window.replay.btns.btn1.clicked.connect(functools.partial(self.replay, realtime=True))
-        self.window.replay.btns.btn2.clicked.connect(functools.partial(self.replay, realtime=False))
-        self.window.replay.set_args(self.save_file.name.removeprefix(Toolbox.SAVE_LOC)[1:], Toolbox.SAVE_LOC)
-        self.window.counter.sim_mode.toggled.connect(self.__set_sim)
+        window.save.save_button.clicked.connect(self.save_messages)
+
+        window.play.stopReplay.connect(self.stop_replay)
+        window.play.speed_txt.valueChanged.connect(self.speed_update)
+        window.play.turbo.toggled.connect(self.set_turbo)
+        self.speed_update(window.play.speed_txt.value())
+        window.replay.btns.btn1.clicked.connect(functools.partial(self.replay, realtime=True))
+        window.replay.btns.btn2.clicked.connect(functools.partial(self.replay, realtime=False))
+        window.replay.btns.optimize.clicked.connect(functools.partial(self.process_replay, minimize=False))
+        window.replay.btns.minimize.clicked.connect(functools.partial(self.process_replay, minimize=True))
+        window.replay.btns.ghost.clicked.connect(self.load_ghost)
+        window.heatmap.kind.currentTextChanged.connect(self.set_heatmap_kind)
+        window.heatmap.build.clicked.connect(self.build_heatmap)
+        window.diff.button.clicked.connect(self.request_diff)
+        window.replay.btns.resume.clicked.connect(self.request_resume)
+        window.replay.set_args(self.save_file.name.removeprefix(Toolbox.SAVE_LOC)[1:], Toolbox.SAVE_LOC)
+        window.counter.sim_mode.toggled.connect(self.request_sim)
+        window.timeline.seek.connect(self.request_seek)
+        window.query.input.returnPressed.connect(self.request_query)
+        window.query.jump.connect(self.request_seek)
+        window.play.switched.connect(self.__play_switched)
+
+        # widget updates posted by the game thread are applied at display rate
+        timer = QtCore.QTimer()
+        timer.timeout.connect(functools.partial(self.ui.drain, window))
+        timer.start(16)
+
+        window.showInit()
+        self.window = window
+        if STARTUP_TIMING:
+            print(f'hack: toolbox window up in {(time.perf_counter() - start) * 1000:.0f}ms', file=sys.stderr)
 
         app.exec()
 
     @property
     def play_state(self):
-        return self.window.play.state
+        return self.__play_state
 
     def set_play_state(self, state):
-        self.window.play.set_state(state)
+        self.__play_state = state
+        self.ui.set('play.set_state', state)
+
+    def __play_switched(self, state):
+        self.__play_state = state
 
     def speed_update(self, speed):
         import game.engine.gfx
 
         game.engine.gfx.TICKRATE = 60 * speed
 
-    def __set_sim(self, checked):
-        with self.lock:
-            if checked:
-                self.is_sim = True
-                self.window.counter.set_tick(len(self.__sub_msgs), 0, 0)
-                return
+    def set_turbo(self, checked):
+        self.turbo = checked
 
-            assert self.__snapshot_index == 0
-            self.is_sim = False
-            self.__unsub_msgs = []
-            self.window.counter.set_tick(len(self.__sub_msgs))
+    def request_sim(self, checked):
+        self.pending_sim = checked
+
+    def sync_sim(self):
+        # sim mode only flips between ticks, on the game thread
+        checked, self.pending_sim = self.pending_sim, None
+        if checked is None or checked == self.is_sim:
+            return
+        if checked:
+            self.index.clear()
+            self.is_sim = True
+            self.__mark_submitted(self.save_file.tell())
+            self.ui.set('set_tick', len(self.__sub_msgs), 0, 0)
+            return
+
+        if self.__snapshot_index != 0:
+            self.ui.set('counter.sim_mode.setChecked', True)
+            return
+        self.is_sim = False
+        if self.__unsub_msgs:
+            # the redo tail was never sent
+            loc = self.__unsub_msgs[0][0]
+            self.save_file.truncate(loc)
+            self.save_file.seek(loc, 0)
+        if os.path.exists(Toolbox.__boundary_path(self.save_file.name)):
+            os.remove(Toolbox.__boundary_path(self.save_file.name))
+        self.gc.released(s for _, s, _ in self.__unsub_msgs)
+        self.__unsub_msgs = []
+        self.index.clear()
+        self.ui.set('set_tick', len(self.__sub_msgs))
 
     def toggle_sim(self):
-        if self.is_sim:
-            if self.__snapshot_index == 0:
-                self.window.counter.sim_mode.setChecked(False)
-        else:
-            self.window.counter.sim_mode.setChecked(True)
+        if self.is_sim and self.__snapshot_index != 0:
+            return
+        self.request_sim(not self.is_sim)
+        self.ui.set('counter.sim_mode.setChecked', not self.is_sim)
+
+    def toggle_turbo(self):
+        self.set_turbo(not self.turbo)
+        self.ui.set('play.turbo.setChecked', self.turbo)
     
 def get_clipboard_text():
     from PySide6 import QtGui
@@ -433,6 +815,8 @@ class HackedScreenFader(game.engine.screen_fader.ScreenFader):
 import game.venator
 import imgui
 
+from hack.sim import CaptureNet, Simulator, add_extra_items
+
 # game.components.weapon
 import game.components.weapon.weapon
 
@@ -458,12 +842,25 @@ class FakeNet:
         if not toolbox.enqueue_msg(msg):
             return
         if self.real_net is not None:
-            self.real_net.send_one(msg)
+            toolbox.send(self.real_net, [msg])
 
 
 @inject_class
 class HackedVenator(game.venator.Venator):
+    def server_state(self):
+        # the state field the next message would carry, i.e. what the server restored on connect
+        net_old = self.net
+        self.net = CaptureNet()
+        try:
+            super().send_game_info()
+            msgs = self.net.msgs
+        finally:
+            self.net = net_old
+        return json.loads(msgs[-1])['state'] if msgs else None
+
     def send_game_info(self):
+        if isinstance(self.net, CaptureNet):
+            return super().send_game_info()
         net_old = self.net
         try:
             self.net = FakeNet(net_old)
@@ -522,7 +919,10 @@ import game.components.items
 
 from game.engine.keys import Keys
 
-from hack.backup import GameBackup
+from hack.backup import DIFF_LIMIT, GameBackup
+from hack.hud import ExtraInfo
+from hack.scheduler import TickScheduler
+from hack.throttle import RenderThrottle
 
 
 @inject_class
@@ -534,22 +934,30 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
         super().__init__(*args, **kwargs)
         global gui_obj
         gui_obj = self
+        # only the game exits hard; importing hack elsewhere (workers, tests) keeps a normal exit status
+        atexit.register(os._exit, 0)
 
-        toolbox.window.unfocus_func = self.wnd._window.activate
+        toolbox.unfocus_func = self.wnd._window.activate
         self.loading_screen_timer = 1
         self.__is_camera_following = True
         self.__key_pressing = set()
         self.__mouse_pos = (0, 0)
-        self.__last_ticked = None
+        self.__scheduler = TickScheduler()
+        self.__extra_info = ExtraInfo()
+        self.__heatmap = None
+        self.__throttle = RenderThrottle()
 
-        self.imgui_io.get_clipboard_text_fn = get_clipboard_text
-        self.imgui_io.set_clipboard_text_fn = set_clipboard_text
+        if not Toolbox.HEADLESS:
+            self.imgui_io.get_clipboard_text_fn = get_clipboard_text
+            self.imgui_io.set_clipboard_text_fn = set_clipboard_text
 
     def __pre_tick(self, *args, **kwargs):
-        with toolbox.lock:
-            if toolbox.is_sim:
-                toolbox.set_snapshot(GameBackup.generate_snapshot(self.game))
-            super().tick(*args, **kwargs)
+        if toolbox.is_sim:
+            toolbox.record_tick(self.game)
+            # fader ticks are collapsed into the undo entry before the fade
+            toolbox.set_snapshot(
+                GameBackup.generate_snapshot(self.game) if self.game.screen_fader is None else None)
+        super().tick(*args, **kwargs)
 
     def __game_waiting_server(self):
         return self.game.waiting_for_server_txt or self.game.module_reloading
@@ -557,7 +965,18 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
     def scale_imgui(self, size):
         return size * self.scale / self.camera.scale
 
+    def __render_key(self):
+        return (
+            id(self.game), self.camera.position.x, self.camera.position.y, self.camera.scale,
+            self.wnd.viewport_size, self.__mouse_pos, frozenset(self.__key_pressing),
+            toolbox.should_show_extra_info, toolbox.show_ghost, id(toolbox.ghost),
+            toolbox.heatmap_kind, id(toolbox.heatmaps), toolbox.sim_index,
+        )
+
     def draw(self):
+        paused = toolbox.play_state == 'pause' and not toolbox.pending_replays
+        self.__throttle.wait(self.__render_key(), paused, held=bool(self.__key_pressing))
+
         if self.game is not None and self.__game_waiting_server():
             draw_list = imgui.get_overlay_draw_list()
             if toolbox.has_pending_unsub():
@@ -576,41 +995,44 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
             else:
                 text_color = (0, 0, 0, 1)
             text_font_size = 20
-            npcs = [o.name for o in self.game.objects if o.nametype == "NPC"]
             starting_y = 30
             y_offset = text_font_size + 5
-            rows_to_display = []
-            if len(npcs) > 0:
-                rows_to_display.append('NPC({0}): {1}'.format(len(npcs), npcs))
-            items = [o.display_name for o in self.game.objects if o.nametype == "Item"]
-            if len(items) > 0:
-                rows_to_display.append('Items({0}): {1}'.format(len(items), items))
-            weapons = [o.get("type") for o in self.game.tiled_map.weapons]
-            if len(weapons) > 0:
-                rows_to_display.append('Weapons({0}): {1}, has: {2}, equipped: {3}'.format(
-                    len(weapons),
-                    weapons,
-                    [w.display_name for w in self.game.player.weapons],
-                    [w.display_name for w in filter(lambda x: x.equipped, self.game.player.weapons)]))
-            if hasattr(self.game, 'gem_collection'):
-                gems = [o.name for o in self.game.objects if o.nametype == "gem"]
-                text = 'Gems({0}): '.format(len(gems))
-                text_parts = []
-                if hasattr(self.game.gem_collection, 'count_all_gems'):
-                    text_parts.append('count_all_gems: {0}'.format(self.game.gem_collection.count_all_gems()))
-                if hasattr(self.game.gem_collection, 'gems'):
-                    text_parts.append('len(gems) - 1(root): {0}'.format(len(self.game.gem_collection.gems) - 1))
-                text += ', '.join(text_parts)
-                rows_to_display.append(text)
+            rows_to_display = self.__extra_info.rows(self.game)
 
             for row in rows_to_display:
                 draw_list.add_text_with_font_size(
                     30, starting_y, imgui.get_color_u32_rgba(*text_color),
                     row, text_font_size)
                 starting_y += y_offset
+        # heatmap of every saved replay, drawn as one texture
+        grid = toolbox.heatmap(self.game.current_map) if self.game is not None else None
+        if grid is not None:
+            fro_x, fro_y = self.game_coord_to_window_viewport(0, grid.shape[0] * CELL)
+            to_x, to_y = self.game_coord_to_window_viewport(grid.shape[1] * CELL, 0)
+            imgui.get_background_draw_list().add_image(
+                self.__heatmap_texture(grid).glo, (fro_x, fro_y), (to_x, to_y))
+        # ghost path of the previous branch or a loaded replay
+        if self.game is not None and toolbox.ghost is not None and toolbox.show_ghost:
+            draw_list = imgui.get_background_draw_list()
+            color = imgui.get_color_u32_rgba(1, 1, 1, .6)
+            w, h = self.wnd.viewport_size
+            for line in toolbox.ghost.segments(
+                    self.game.current_map, self.camera.position.x, self.camera.position.y,
+                    self.camera.viewport_width, self.camera.viewport_height, w, h):
+                draw_list.add_polyline(line.tolist(), color, thickness=self.scale_imgui(2))
 
         super().draw()
 
+    def __heatmap_texture(self, grid):
+        if self.__heatmap is None or self.__heatmap[0] is not grid:
+            if self.__heatmap is not None:
+                self.imgui.remove_texture(self.__heatmap[1])
+                self.__heatmap[1].release()
+            texture = self.ctx.texture((grid.shape[1], grid.shape[0]), 4, to_rgba(grid).tobytes())
+            self.imgui.register_texture(texture)
+            self.__heatmap = (grid, texture)
+        return self.__heatmap[1]
+
     def tick(self, *args, **kwargs):
         if self.game is None:
             if self.loading_screen_timer > 0:
@@ -618,15 +1040,16 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
                 return
             self.setup_game()
             if hasattr(self.argv, 'extra_items') and self.argv.extra_items:
-                for d in self.argv.extra_items:
-                    if not any([i["display_name"] == d for i in self.game.items]):
-                        it = game.components.items.Item(None, game.components.items.display_to_name(d), d)
-                        it.collected_time = 1
-                        self.game.items.append(it)
+                add_extra_items(self.game, self.argv.extra_items)
 
         if not self.game.ready:
             return
 
+        toolbox.sync_sim()
+        toolbox.run_query()
+        toolbox.diff_ticks()
+        self.__apply_search()
+
         if self.boss_bg is None:
             if self.game.current_map.endswith("_boss"):
                 self.boss_bg = game.venator_gui.BossBG()
@@ -636,54 +1059,63 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
         self._center_camera_to_player()
 
         if toolbox.is_sim:
+            if toolbox.pending_seek is not None:
+                index, toolbox.pending_seek = toolbox.pending_seek, None
+                self.__seek(index)
+                return
+
             if self.wnd.keys.Z in self.__key_pressing:
-                while True:
-                    top = toolbox.undo_one()
-                    if top is None:
-                        return
+                top = toolbox.undo_one()
+                if top is not None:
                     self.game = GameBackup.inflate_snapshot(top)
+                    self.__extra_info.invalidate()
                     assert not self.__game_waiting_server()
-                    if self.game.screen_fader is None:
-                        return
+                return
 
             if self.wnd.keys.X in self.__key_pressing:
-                while True:
-                    top = toolbox.redo_one()
-                    if top is None:
-                        return
+                top = toolbox.redo_one()
+                if top is not None:
                     self.game = GameBackup.inflate_snapshot(top)
-                    if self.game.screen_fader is None:
-                        return
+                    self.__extra_info.invalidate()
+                return
 
+        submitting = toolbox.update_submit_progress()
         if self.__game_waiting_server():
-            self.game.recv_from_server()
+            # the server only answers once it has seen every submitted tick
+            if not submitting:
+                self.game.recv_from_server()
             return
 
         if not self.game.map_loaded:
             self.game.map_loaded = True
             self.game.setup()
 
-        toolbox.window.show_async()
+        toolbox.show_window()
+        if toolbox.pending_resume:
+            toolbox.pending_resume = False
+            toolbox.resume(self.game.server_state())
 
         if toolbox.pending_replays:
             toolbox.set_play_state('replay')
 
             if toolbox.replay_realtime:
-                lag = 1
-
-                now = time.time()
-                if self.__last_ticked is not None:
-                    lag = math.ceil((now - self.__last_ticked) * game.engine.gfx.TICKRATE)
-                self.__last_ticked = now
-
-                for _ in range(lag):
+                if toolbox.turbo:
+                    rate, budget = TickScheduler.TURBO_RATE, TickScheduler.TURBO_BUDGET
+                else:
+                    rate, budget = game.engine.gfx.TICKRATE, TickScheduler.FRAME_BUDGET
+                start = time.perf_counter()
+                ran = 0
+                for _ in range(self.__scheduler.due(rate, budget)):
                     top = toolbox.pending_replays.pop(0)
                     self.game.raw_pressed_keys = set((Keys.from_serialized(k) for k in top['keys']))
                     self.__pre_tick(*args, **kwargs)
+                    ran += 1
                     if not toolbox.pending_replays or self.__game_waiting_server():
                         break
+                self.__scheduler.ran(ran, time.perf_counter() - start)
+                self.__report_rate()
             else:
-                self.__last_ticked = None
+                self.__scheduler.reset()
                 while toolbox.pending_replays:
                     top = toolbox.pending_replays.pop(0)
                     self.game.raw_pressed_keys = set((Keys.from_serialized(k) for k in top['keys']))
@@ -693,12 +1125,7 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
 
             return
 
-        if self.game.player is not None and (self.game.player.stamina <= 0 or (
-                self.wnd.keys.A not in self.__key_pressing and self.wnd.keys.D not in self.__key_pressing)):
-            self.game.raw_pressed_keys.discard(Keys.LSHIFT)
-        else:
-            if self.wnd.keys.LEFT_SHIFT in self.__key_pressing:
-                self.game.raw_pressed_keys.add(Keys.LSHIFT)
+        self.__apply_sprint()
 
         if self.game.screen_fader is not None:
             self.game.raw_pressed_keys.clear()
@@ -713,9 +1140,12 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
                 toolbox.set_play_state('pause')
                 return
             case 'play':
-                pass
+                if toolbox.turbo:
+                    self.__turbo(*args, **kwargs)
+                    return
             case 'pause':
                 if len(self.game.tracked_keys & self.game.raw_pressed_keys) == 0:
+                    toolbox.gc.idle()
                     return
                 toolbox.set_play_state('step')
             case 'step':
@@ -723,9 +1153,50 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
                     toolbox.set_play_state('pause')
                     return
 
+        self.__scheduler.reset()
         self.__pre_tick(*args, **kwargs)
 
+    def __seek(self, index):
+        found = toolbox.seek(index)
+        if found is None:
+            return
+        keyframe, snapshot, msgs = found
+        self.game = GameBackup.inflate_snapshot(snapshot)
+        # the buffer keeps a snapshot of its own, the re-simulation below must not reach into the one restored
+        toolbox.replace_keyframe(keyframe, GameBackup.generate_snapshot(self.game))
+        sim = Simulator(self.game)
+        for msg in msgs:
+            sim.step(Keys.from_serialized(k) for k in json.loads(msg)['keys'])
+        self.__extra_info.invalidate()
+
+    def __apply_sprint(self):
+        if self.game.player is not None and (self.game.player.stamina <= 0 or (
+                self.wnd.keys.A not in self.__key_pressing and self.wnd.keys.D not in self.__key_pressing)):
+            self.game.raw_pressed_keys.discard(Keys.LSHIFT)
+        else:
+            if self.wnd.keys.LEFT_SHIFT in self.__key_pressing:
+                self.game.raw_pressed_keys.add(Keys.LSHIFT)
+
+    def __report_rate(self):
+        if self.__scheduler.should_report():
+            toolbox.ui.set(
+                'counter.set_rate', self.__scheduler.achieved, self.__scheduler.target, self.__scheduler.skipped_renders)
+
+    def __turbo(self, *args, **kwargs):
+        # as many ticks as fit in the frame budget, rendering once at the end
+        start = time.perf_counter()
+        ran = 0
+        for _ in range(self.__scheduler.due(TickScheduler.TURBO_RATE, TickScheduler.TURBO_BUDGET)):
+            self.__pre_tick(*args, **kwargs)
+            ran += 1
+            if self.game.screen_fader is not None or self.__game_waiting_server():
+                break
+            self.__apply_sprint()
+        self.__scheduler.ran(ran, time.perf_counter() - start)
+        self.__report_rate()
+
     def key_event(self, key: Any, action: Any, modifiers: KeyModifiers):
+        self.__throttle.input()
         self.imgui_io.key_ctrl = modifiers.ctrl
         super().key_event(key, action, modifiers)
 
@@ -742,14 +1213,13 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
                 if toolbox.is_sim:
                     unsubs = toolbox.submit_unsubs()
                     if self.net is not None:
-                        for u in unsubs:
-                            self.net.send_one(u)
+                        toolbox.send(self.net, unsubs)
             case self.wnd.keys.K:
                 toolbox.toggle_sim()
             case self.wnd.keys.COMMA:
-                toolbox.window.play.speed.step(-1)
+                toolbox.ui.post('play.speed.step', -1)
             case self.wnd.keys.PERIOD:
-                toolbox.window.play.speed.step(1)
+                toolbox.ui.post('play.speed.step', 1)
             case self.wnd.keys.C:
                 if not self.__is_camera_following:
                     self.__is_camera_following = True
@@ -762,11 +1232,70 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
                     self.camera.update()
             case self.wnd.keys.H:
                 toolbox.should_show_extra_info = not toolbox.should_show_extra_info
+            case self.wnd.keys.T:
+                toolbox.toggle_turbo()
+            case self.wnd.keys.G:
+                toolbox.show_ghost = not toolbox.show_ghost
+            case self.wnd.keys.P:
+                self.__search_to_cursor()
             case _:
                 self.__key_pressing.discard(symbol)
                 if Keys.from_ui(symbol) in self.game.tracked_keys and not toolbox.pending_replays:
                     super().on_key_release(symbol, modifiers)
 
+    def __search_to_cursor(self):
+        from hack.search import SearchProcess, point_heuristic
+        from hack.search_pool import SearchPool, WORKERS
+
+        if toolbox.search is not None and toolbox.search.busy:
+            toolbox.search.cancel()
+            toolbox.set_status('Cancelling search...')
+            return
+        if not toolbox.is_sim or toolbox.pending_replays or self.__game_waiting_server():
+            return
+        if self.game.player is None:
+            return
+
+        x, y = self.window_to_game_coord(*self.__mouse_pos)
+        target = min(
+            (o for o in self.game.objects
+             if o is not self.game.player and not isinstance(o, game.components.wall.Wall)),
+            key=lambda o: math.hypot(o.x - x, o.y - y), default=None)
+        if target is None:
+            return
+
+        name = target.__class__.__name__
+        extra_items = getattr(self.argv, 'extra_items', None) or ()
+        # runs in the background; the route is only played if the game is still where the search started
+        if toolbox.search is None:
+            toolbox.search = SearchPool(extra_items=extra_items) if WORKERS > 1 else SearchProcess(extra_items)
+        position = toolbox.position
+
+        def progress(depth, ticks):
+            toolbox.set_status(f'Searching to {name}: depth {depth}, {ticks} ticks (P to cancel)')
+
+        def done(msgs, cancelled, summary):
+            outcome = 'cancelled' if cancelled else 'not found' if msgs is None else 'found'
+            toolbox.set_status(f'Search to {name}: {outcome}, {summary}')
+            if msgs is not None and not cancelled:
+                toolbox.pending_search = position, msgs
+
+        toolbox.search.start(
+            toolbox.key_prefix(), Simulator(self.game).position_key(), point_heuristic(target.x, target.y),
+            progress, done)
+        toolbox.set_status(f'Searching to {name}...')
+
+    def __apply_search(self):
+        if toolbox.pending_search is None:
+            return
+        (position, msgs), toolbox.pending_search = toolbox.pending_search, None
+        if not toolbox.is_sim or toolbox.pending_replays or position != toolbox.position:
+            toolbox.set_status('Search result dropped: the game moved on while searching')
+            return
+        toolbox.save_search(msgs)
+        toolbox.pending_replays = [json.loads(m) for m in msgs]
+        toolbox.replay_realtime = True
+
     def window_to_game_coord(self, x, y):
         actual_x = self.camera.position.x + x / self.wnd.width * self.camera.viewport_width
         actual_y = self.camera.position.y + (1 - y / self.wnd.height) * self.camera.viewport_height
@@ -782,6 +1311,7 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
         self.__mouse_pos = (x, y)
 
     def mouse_scroll_event(self, x_offset, y_offset):
+        self.__throttle.input()
         diff = y_offset / 6
         if self.wnd.keys.LEFT_CTRL in self.__key_pressing:
             diff *= 2
@@ -796,6 +1326,7 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
             self.camera.update()
 
     def mouse_drag_event(self, x, y, dx, dy):
+        self.__throttle.dragged()
         if self.wnd.mouse_states.right:
             self.__is_camera_following = False
             scale = self.camera.scale / self.wnd.width * self.camera.init_w
@@ -812,5 +1343,5 @@ class HackedHackceler8(game.venator_gui.Hackceler8):
             self.camera.update()
 
 
-import atexit
-atexit.register(lambda: os._exit(0))
\ No newline at end of file
+if STARTUP_TIMING:
+    print(f'hack: imported in {(time.perf_counter() - _import_start) * 1000:.0f}ms', file=sys.stderr)
\ No newline at end of file
@@ -1,6 +1,8 @@
 import collections
 import copy
 import functools
+import hashlib
+import os
 import threading
 import enum
 from types import NoneType, GeneratorType
@@ -42,28 +44,67 @@ NO_RECORD = (
     'won',
 )
 
+_MISSING = object()
+
+
+def _same(obj):
+    return obj
+
+
+def _frame(node):
+    # (frame state, resume offset, local and stack slots) of a backed up generator, _MISSING for unbound slots
+    return generator_hack.frame(node.back, _MISSING)
+
+# diff_snapshots stops after this many changes
+DIFF_LIMIT = 500
+
+# attributes that always differ between otherwise identical states
+HASH_IGNORE = (
+    'tics',
+)
+
 
 class Container:
+    __slots__ = ('inst', 'cls', 'copy')
+    inst: any
     cls: type
     copy: tuple
 
 
 class Object:
+    __slots__ = ('inst', 'attr')
     inst: any
     attr: dict
 
 
 class Random:
+    __slots__ = ('state',)
     state: any
 
 
 class Generator:
+    __slots__ = ('back',)
     back: any
 
 
+_NODES = (Object, Container, Generator, dict)
+_PLAIN = frozenset((int, float, bool, str, bytes, NoneType))
+
+
+# the native walker in generator_hack mirrors GameBackup.__generate_snapshot
+NATIVE_WALKER = hasattr(generator_hack, 'snapshot') and not os.environ.get('HACK_PY_WALKER')
+VERIFY_WALKER = NATIVE_WALKER and bool(os.environ.get('HACK_VERIFY_WALKER'))
+
+if NATIVE_WALKER:
+    generator_hack.configure(
+        DEEP_COPYABLE_CLS, np.ndarray, SKIP_CLS, PRIMITIVE_CLS, CONTAINER_CLS, game.venator.Venator, NO_RECORD,
+        Container, Object, Generator, copy.deepcopy, np.copy,
+    )
+
+
 class GameBackup:
     @staticmethod
-    def __generate_snapshot(obj, storage, layer):
+    def __generate_snapshot(obj, storage, generators, layer):
         if isinstance(obj, DEEP_COPYABLE_CLS):
             return copy.deepcopy(obj)
 
@@ -80,16 +121,16 @@ class GameBackup:
         if isinstance(obj, GeneratorType):
             g = Generator()
             storage[obj_id] = g
-            g.back = generator_hack.backup(
-                obj, functools.partial(GameBackup.__generate_snapshot, storage=storage, layer=layer))
+            generators.append((g, obj))
             return g
 
         if isinstance(obj, CONTAINER_CLS):
             c = Container()
             storage[obj_id] = c
 
+            c.inst = obj
             c.cls = type(obj)
-            c.copy = tuple(GameBackup.__generate_snapshot(o, storage, layer + [(None, type(o))]) for o in obj)
+            c.copy = tuple(GameBackup.__generate_snapshot(o, storage, generators, layer + [(None, type(o))]) for o in obj)
 
             return c
 
@@ -98,7 +139,7 @@ class GameBackup:
             storage[obj_id] = d
 
             for k, v in obj.items():
-                d[k] = GameBackup.__generate_snapshot(v, storage, layer + [(k, type(v))])
+                d[k] = GameBackup.__generate_snapshot(v, storage, generators, layer + [(k, type(v))])
 
             return d
 
@@ -118,25 +159,294 @@ class GameBackup:
             v = getattr(obj, k)
             if callable(v):
                 continue
-            o.attr[k] = GameBackup.__generate_snapshot(v, storage, layer + [(k, type(v))])
+            o.attr[k] = GameBackup.__generate_snapshot(v, storage, generators, layer + [(k, type(v))])
 
         return o
 
     @staticmethod
-    def generate_snapshot(obj):
+    def __walk(obj, native):
         storage = {}
-        return GameBackup.__generate_snapshot(obj, storage, [])
+        generators = []
+        if native:
+            snapshot = generator_hack.snapshot(obj, storage, generators)
+
+            def backup_func(o):
+                return generator_hack.snapshot(o, storage, generators)
+        else:
+            snapshot = GameBackup.__generate_snapshot(obj, storage, generators, [])
+            backup_func = functools.partial(
+                GameBackup.__generate_snapshot, storage=storage, generators=generators, layer=[(None, GeneratorType)])
+
+        # generator frames are backed up in batches, which may discover more generators
+        while generators:
+            batch = generators[:]
+            generators.clear()
+            backs = generator_hack.backup_many([gen for _, gen in batch], backup_func)
+            for (g, _), back in zip(batch, backs):
+                g.back = back
+
+        return snapshot
+
+    @staticmethod
+    def generate_snapshot(obj, native=NATIVE_WALKER):
+        snapshot = GameBackup.__walk(obj, native)
+        if native and VERIFY_WALKER:
+            GameBackup.assert_same_snapshot(GameBackup.__walk(obj, False), snapshot)
+        return snapshot
+
+    @staticmethod
+    def __assert_same_snapshot(a, b, seen, path):
+        assert type(a) is type(b), (path, type(a), type(b))
+
+        if isinstance(a, (Generator, Container, Object, dict)):
+            if id(a) in seen:
+                assert seen[id(a)] == id(b), path
+                return
+            seen[id(a)] = id(b)
+
+        if isinstance(a, Generator):
+            state_a, lasti_a, slots_a = _frame(a)
+            state_b, lasti_b, slots_b = _frame(b)
+            assert a.back.gi_code is b.back.gi_code, path
+            assert (state_a, lasti_a, len(slots_a)) == (state_b, lasti_b, len(slots_b)), path
+            for i, (x, y) in enumerate(zip(slots_a, slots_b)):
+                GameBackup.__assert_same_snapshot(x, y, seen, path + [f'<slot {i}>'])
+        elif isinstance(a, Container):
+            assert a.inst is b.inst and a.cls is b.cls and len(a.copy) == len(b.copy), path
+            for i, (x, y) in enumerate(zip(a.copy, b.copy)):
+                GameBackup.__assert_same_snapshot(x, y, seen, path + [i])
+        elif isinstance(a, dict):
+            assert list(a) == list(b), path
+            for k in a:
+                GameBackup.__assert_same_snapshot(a[k], b[k], seen, path + [k])
+        elif isinstance(a, Object):
+            assert a.inst is b.inst and list(a.attr) == list(b.attr), path
+            for k in a.attr:
+                GameBackup.__assert_same_snapshot(a.attr[k], b.attr[k], seen, path + [k])
+        elif isinstance(a, np.ndarray):
+            assert np.array_equal(a, b), path
+        else:
+            assert a is b or a == b or a.__reduce_ex__(2) == b.__reduce_ex__(2), path
+
+    @staticmethod
+    def assert_same_snapshot(a, b):
+        GameBackup.__assert_same_snapshot(a, b, {}, [])
+
+    @staticmethod
+    def __diff(a, b, path, seen, out, limit):
+        if len(out) >= limit:
+            return
+        cls = type(a)
+        if cls in (Object, Container, dict, Generator):
+            key = (id(a), id(b))
+            if key in seen:
+                return
+            seen.add(key)
+
+        if cls is not type(b):
+            out.append((path, a, b))
+        elif cls is Object:
+            if a.inst is not b.inst:
+                out.append((path, a, b))
+                return
+            GameBackup.__diff_items(a.attr, b.attr, path, '.{}', seen, out, limit)
+        elif cls is Container:
+            if a.cls is not b.cls or len(a.copy) != len(b.copy):
+                out.append((path, a, b))
+            elif issubclass(a.cls, (set, frozenset)):
+                if set(map(GameBackup.__member, a.copy)) != set(map(GameBackup.__member, b.copy)):
+                    out.append((path, a, b))
+            else:
+                for i, (x, y) in enumerate(zip(a.copy, b.copy)):
+                    GameBackup.__diff(x, y, (path, f'[{i}]'), seen, out, limit)
+        elif cls is dict:
+            GameBackup.__diff_items(a, b, path, '[{!r}]', seen, out, limit)
+        elif cls is Generator:
+            code = a.back.gi_code
+            state_a, lasti_a, slots_a = _frame(a)
+            state_b, lasti_b, slots_b = _frame(b)
+            if code is not b.back.gi_code or (state_a, lasti_a, len(slots_a)) != (state_b, lasti_b, len(slots_b)):
+                out.append((path, a, b))
+                return
+            for i, (x, y) in enumerate(zip(slots_a, slots_b)):
+                name = code.co_varnames[i] if i < len(code.co_varnames) else f'<slot {i}>'
+                GameBackup.__diff(x, y, (path, f'.{name}'), seen, out, limit)
+        elif isinstance(a, np.ndarray):
+            if not np.array_equal(a, b):
+                out.append((path, a, b))
+        elif isinstance(a, random.Random):
+            if a.getstate() != b.getstate():
+                out.append((path, a, b))
+        elif isinstance(a, range_iterator):
+            if a.__reduce__() != b.__reduce__():
+                out.append((path, a, b))
+        elif a is not b and a != b:
+            # an unchanged NaN is the same object in both snapshots
+            out.append((path, a, b))
+
+    @staticmethod
+    def __member(node):
+        # set members: live objects by identity, values such as tuples by content
+        if isinstance(node, Object):
+            return 'object', id(node.inst)
+        return GameBackup.__fingerprint(node, {}, (), {})
+
+    @staticmethod
+    def __diff_items(a, b, path, fmt, seen, out, limit):
+        for k, x in a.items():
+            GameBackup.__diff(x, b.get(k, _MISSING), (path, fmt.format(k)), seen, out, limit)
+        for k, y in b.items():
+            if k not in a:
+                out.append(((path, fmt.format(k)), _MISSING, y))
+
+    @staticmethod
+    def __format_path(path):
+        parts = []
+        while isinstance(path, tuple):
+            path, part = path
+            parts.append(part)
+        return path + ''.join(reversed(parts))
+
+    @staticmethod
+    def diff_snapshots(a, b, limit=DIFF_LIMIT):
+        # (path, old, new) for every differing leaf, at most limit of them
+        out = []
+        GameBackup.__diff(a, b, 'game', set(), out, limit)
+        return [(GameBackup.__format_path(path), x, y) for path, x, y in out]
 
     @staticmethod
-    def __inflate_snapshot(snapshot, storage):
+    def describe(value):
+        if value is _MISSING:
+            return '<missing>'
+        if isinstance(value, Object):
+            return f'<{type(value.inst).__name__}>'
+        if isinstance(value, Container):
+            return f'{value.cls.__name__}[{len(value.copy)}]'
+        if isinstance(value, dict):
+            return f'dict[{len(value)}]'
+        if isinstance(value, Generator):
+            return f'<generator {value.back.gi_code.co_qualname} at {_frame(value)[1]}>'
+        if isinstance(value, np.ndarray):
+            return f'ndarray{value.shape}'
+        text = repr(value)
+        return text if len(text) <= 60 else text[:57] + '...'
+
+    @staticmethod
+    def __fingerprint(snapshot, memo, ignore, ignore_on):
+        # exact type checks first, most of a snapshot is plain values and nodes
+        cls = type(snapshot)
+        if cls in _PLAIN:
+            return snapshot
+
+        if cls in _NODES:
+            ref = memo.get(id(snapshot))
+            if ref is not None:
+                return 'ref', ref
+            memo[id(snapshot)] = len(memo)
+
+        if cls is Object:
+            skip = ignore + ignore_on.get(id(snapshot.inst), ())
+            return type(snapshot.inst).__qualname__, tuple(
+                (k, GameBackup.__fingerprint(v, memo, ignore, ignore_on))
+                for k, v in snapshot.attr.items() if k not in skip)
+
+        if cls is Container:
+            members = snapshot.copy
+            if issubclass(snapshot.cls, (set, frozenset)):
+                # set order follows ids, so members are numbered in an order that holds in every process
+                members = sorted(members, key=GameBackup.__member_key)
+            items = tuple(GameBackup.__fingerprint(ele, memo, ignore, ignore_on) for ele in members)
+            if issubclass(snapshot.cls, (set, frozenset)):
+                items = tuple(sorted(items, key=repr))
+            return snapshot.cls.__name__, items
+
+        if cls is dict:
+            return 'dict', tuple(
+                (repr(k), GameBackup.__fingerprint(v, memo, ignore, ignore_on)) for k, v in snapshot.items())
+
+        if cls is Generator:
+            state, lasti, slots = _frame(snapshot)
+            return 'generator', snapshot.back.gi_code.co_qualname, state, lasti, tuple(
+                GameBackup.__fingerprint(slot, memo, ignore, ignore_on) for slot in slots)
+
+        if isinstance(snapshot, np.ndarray):
+            return 'ndarray', snapshot.dtype.str, snapshot.shape, snapshot.tobytes()
+
+        if isinstance(snapshot, enum.Enum):
+            return type(snapshot).__qualname__, snapshot.name
+
+        if isinstance(snapshot, type):
+            return 'type', snapshot.__qualname__
+
+        if isinstance(snapshot, random.Random):
+            return 'random', snapshot.getstate()
+
+        if isinstance(snapshot, range_iterator):
+            return 'range_iterator', snapshot.__reduce__()[1:]
+
+        if isinstance(snapshot, np.bool_):
+            return bool(snapshot)
+
+        if isinstance(snapshot, PRIMITIVE_CLS):
+            return snapshot
+
+        if snapshot is _MISSING:
+            return 'unbound'
+
+        return type(snapshot).__qualname__
+
+    @staticmethod
+    def __member_key(node):
+        # shallow and memo-free: the type plus primitive fields
+        if isinstance(node, Object):
+            return repr((type(node.inst).__qualname__, tuple(
+                (k, v) for k, v in node.attr.items() if isinstance(v, PRIMITIVE_CLS) and not isinstance(v, type))))
+        if isinstance(node, Container):
+            return repr((node.cls.__name__, len(node.copy)))
+        if isinstance(node, PRIMITIVE_CLS) and not isinstance(node, type):
+            return repr((type(node).__qualname__, node))
+        return repr((type(node).__qualname__,))
+
+    @staticmethod
+    def hash_snapshot(snapshot, ignore=HASH_IGNORE, ignore_on=None):
+        # stable across processes, so workers and the coordinator agree on state identity;
+        # ignore_on maps id(live object) to attributes left out on that object only
+        fingerprint = GameBackup.__fingerprint(snapshot, {}, ignore, ignore_on or {})
+        return hashlib.blake2b(repr(fingerprint).encode(), digest_size=16).digest()
+
+    @staticmethod
+    def __inflate_container(snapshot, storage, generators):
+        # restore into the live container, writing only when its contents differ
+        inst = snapshot.inst
+        if isinstance(inst, (list, set, collections.deque)):
+            storage[id(snapshot)] = inst
+            items = [GameBackup.__inflate_snapshot(ele, storage, generators) for ele in snapshot.copy]
+            if isinstance(inst, set):
+                if len(inst) != len(items) or not all(ele in inst for ele in items):
+                    inst.clear()
+                    inst.update(items)
+            elif len(inst) != len(items) or any(a is not b for a, b in zip(inst, items)):
+                inst.clear()
+                inst.extend(items)
+            return inst
+
+        items = [GameBackup.__inflate_snapshot(ele, storage, generators) for ele in snapshot.copy]
+        if len(inst) != len(items) or any(a is not b for a, b in zip(inst, items)):
+            inst = snapshot.cls(items)
+        storage[id(snapshot)] = inst
+        return inst
+
+    @staticmethod
+    def __inflate_snapshot(snapshot, storage, generators):
         snapshot_id = id(snapshot)
         if snapshot_id in storage:
             return storage[snapshot_id]
 
         if isinstance(snapshot, Generator):
-            inflated = snapshot.back
+            # a fresh copy each time, so the backup itself never runs and the snapshot can be restored again
+            inflated = generator_hack.backup(snapshot.back, _same)
             storage[snapshot_id] = inflated
-            generator_hack.inflate(inflated, functools.partial(GameBackup.__inflate_snapshot, storage=storage))
+            generators.append(inflated)
             return inflated
 
         if isinstance(snapshot, Random):
@@ -146,27 +456,67 @@ class GameBackup:
             return inflated
 
         if isinstance(snapshot, Container):
-            inflated = snapshot.cls((GameBackup.__inflate_snapshot(ele, storage) for ele in snapshot.copy))
-            storage[snapshot_id] = inflated
-            return inflated
+            return GameBackup.__inflate_container(snapshot, storage, generators)
 
         if isinstance(snapshot, dict):
             inflated = {}
             storage[snapshot_id] = inflated
             for k, v in snapshot.items():
-                inflated[k] = GameBackup.__inflate_snapshot(v, storage)
+                inflated[k] = GameBackup.__inflate_snapshot(v, storage, generators)
             return inflated
 
         if isinstance(snapshot, Object):
             inflated = snapshot.inst
             storage[snapshot_id] = inflated
             for k, v in snapshot.attr.items():
-                setattr(inflated, k, GameBackup.__inflate_snapshot(v, storage))
+                v = GameBackup.__inflate_snapshot(v, storage, generators)
+                if getattr(inflated, k, _MISSING) is not v:
+                    setattr(inflated, k, v)
             return inflated
 
+        # the game changes these in place, so it gets its own copy and the snapshot can be restored again
+        if isinstance(snapshot, DEEP_COPYABLE_CLS):
+            return copy.deepcopy(snapshot)
+
+        if isinstance(snapshot, np.ndarray):
+            return np.copy(snapshot)
+
         return snapshot
 
     @staticmethod
     def inflate_snapshot(snapshot):
         storage = {}
-        return GameBackup.__inflate_snapshot(snapshot, storage)
+        generators = []
+        inflated = GameBackup.__inflate_snapshot(snapshot, storage, generators)
+
+        inflate_func = functools.partial(GameBackup.__inflate_snapshot, storage=storage, generators=generators)
+        while generators:
+            batch = generators[:]
+            generators.clear()
+            generator_hack.inflate_many(batch, inflate_func)
+
+        return inflated
+
+    @staticmethod
+    def teardown(stack, budget):
+        # clear up to budget nodes of dropped snapshots so refcounting frees them without a cyclic collection;
+        # only snapshot nodes are touched, never the live objects they point to
+        while stack and budget > 0:
+            budget -= 1
+            node = stack.pop()
+            cls = type(node)
+            if cls is Object:
+                children, node.attr = node.attr.values(), {}
+            elif cls is Container:
+                children, node.copy = node.copy, ()
+            elif cls is dict:
+                children = list(node.values())
+                node.clear()
+            elif cls is Generator:
+                back, node.back = getattr(node, 'back', None), None
+                if back is None:
+                    continue
+                children = generator_hack.frame(back, None)[2]
+            else:
+                continue
+            stack.extend(v for v in children if type(v) in _NODES)
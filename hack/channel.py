@@ -0,0 +1,40 @@
+import collections
+import operator
+import threading
+
+
+class UpdateChannel:
+    # game thread -> Qt thread widget updates, applied in the order they were posted
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.__queue = collections.deque()
+        self.__values = {}
+        self.__lock = threading.Lock()
+
+    def set(self, name, *args):
+        # a pure setter: only the latest value between two drains is applied, in the place of the first
+        if not self.enabled:
+            return
+        with self.__lock:
+            if name not in self.__values:
+                self.__queue.append((name, None))
+            self.__values[name] = args
+
+    def post(self, name, *args):
+        # an action: every call is applied
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__queue.append((name, args))
+
+    def drain(self, target):
+        # name is an attribute path on the drain target
+        while True:
+            with self.__lock:
+                if not self.__queue:
+                    return
+                name, args = self.__queue.popleft()
+                if args is None:
+                    args = self.__values.pop(name)
+            operator.attrgetter(name)(target)(*args)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from hack.tick_index import TickIndex
+
+
+class Ghost:
+    # player path of another attempt: per-tick map ids and float32 (x, y) positions
+    MIN_STEP = 2
+
+    def __init__(self, maps, map_ids, points):
+        self.maps = maps
+        self.map_ids = map_ids
+        self.points = points
+
+    @staticmethod
+    def from_index(index, start=0, end=None):
+        return Ghost(*index.trajectory('player', start, end))
+
+    def segments(self, current_map, left, bottom, width, height, w, h):
+        # window-space polylines of the part of the path inside the viewport
+        if current_map not in self.maps:
+            return []
+        x = (self.points[:, 0] - left) / width * w
+        y = (1 - (self.points[:, 1] - bottom) / height) * h
+        valid = (self.map_ids == self.maps.index(current_map)) & ~np.isnan(x) & ~np.isnan(y)
+        inside = valid & (x >= 0) & (x <= w) & (y >= 0) & (y <= h)
+
+        keep = inside.copy()
+        keep[1:] |= inside[:-1]
+        keep[:-1] |= inside[1:]
+        keep &= valid
+
+        idx = np.flatnonzero(keep)
+        lines = []
+        for run in np.split(idx, np.flatnonzero(np.diff(idx) != 1) + 1):
+            if len(run) < 2:
+                continue
+            pts = np.stack((x[run], y[run]), axis=1)
+            # drop points that stay within the same few pixels
+            q = np.round(pts / Ghost.MIN_STEP)
+            moved = np.concatenate(([True], np.any(q[1:] != q[:-1], axis=1)))
+            moved[-1] = True
+            lines.append(pts[moved])
+        return lines
+
+
+def build_ghost(src, extra_items=()):
+    from hack.optimizer import load_keys
+    from hack.sim import Simulator
+
+    sim = Simulator(Simulator.new_game(extra_items))
+    index = TickIndex(('x', 'y'))
+    # like sim mode, tick i holds the state the tick starts from
+    for tick, keys in enumerate(load_keys(src)):
+        index.record(tick, sim.game)
+        if sim.step(keys) is None:
+            break
+    return Ghost.from_index(index)
@@ -0,0 +1,132 @@
+import collections
+import glob
+import hashlib
+import re
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+KINDS = ('player', 'enemy', 'hit', 'death')
+CELL = 16
+VERSION = 1
+WORKERS = int(os.environ.get('HACK_ANALYTICS_WORKERS', '0')) or os.cpu_count() or 1
+# autosaves and files derived from other replays (optimized, trimmed, search routes) would count paths twice
+EXCLUDE_DIRS = ('autosave',)
+DERIVED = re.compile(r'(\.(opt|min)\.[\d-]+|^search\.[\d-]+)\.jsonl$')
+
+
+def _grid(points):
+    # counts per CELL x CELL square, row 0 at y = 0
+    if not points:
+        return np.zeros((1, 1), dtype=np.int32)
+    cells = np.maximum(np.floor_divide(np.asarray(points, dtype=np.float64), CELL), 0).astype(np.int64)
+    w, h = cells[:, 0].max() + 1, cells[:, 1].max() + 1
+    counts = np.bincount(cells[:, 1] * w + cells[:, 0], minlength=w * h)
+    return counts.reshape(h, w).astype(np.int32)
+
+
+def _merge(a, b):
+    h, w = max(a.shape[0], b.shape[0]), max(a.shape[1], b.shape[1])
+    out = np.zeros((h, w), dtype=np.int32)
+    out[:a.shape[0], :a.shape[1]] += a
+    out[:b.shape[0], :b.shape[1]] += b
+    return out
+
+
+def cache_key(src, extra_items=()):
+    # path, size and mtime: replays are only ever written whole, so this is enough to notice a change
+    st = os.stat(src)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{VERSION}/{CELL}/{sorted(extra_items)}/{os.path.abspath(src)}/{st.st_size}/{st.st_mtime_ns}'.encode())
+    return h.hexdigest()
+
+
+def sources(root):
+    # the replays a heatmap is built from: hand-saved ones only
+    ret = []
+    for f in glob.iglob('**/*.jsonl', root_dir=root, recursive=True):
+        parts = f.split(os.sep)
+        if any(p in EXCLUDE_DIRS for p in parts[:-1]) or DERIVED.search(parts[-1]):
+            continue
+        ret.append(os.path.join(root, f))
+    return ret
+
+
+def analyze_replay(src, extra_items=()):
+    # {map: {kind: grid}} of one replay, simulated headlessly
+    from hack.optimizer import load_keys
+    from hack.sim import Simulator
+
+    sim = Simulator(Simulator.new_game(extra_items))
+    points = collections.defaultdict(lambda: {k: [] for k in KINDS})
+    health = None
+    dead = False
+    for keys in load_keys(src):
+        if sim.step(keys) is None:
+            break
+        game = sim.game
+        player = game.player
+        if player is None:
+            continue
+        p = points[game.current_map]
+        pos = (player.x, player.y)
+        p['player'].append(pos)
+        for o in game.objects:
+            if o.nametype == 'Enemy' and not getattr(o, 'dead', False):
+                p['enemy'].append((o.x, o.y))
+
+        now_health = getattr(player, 'health', None)
+        if health is not None and now_health is not None and now_health < health:
+            p['hit'].append(pos)
+        health = now_health
+        now_dead = bool(getattr(player, 'dead', False)) or (now_health is not None and now_health <= 0)
+        if now_dead and not dead:
+            p['death'].append(pos)
+        dead = now_dead
+
+    return {m: {k: _grid(v) for k, v in kinds.items()} for m, kinds in points.items()}
+
+
+def _cached_analysis(src, cache_dir, extra_items):
+    path = os.path.join(cache_dir, cache_key(src, extra_items) + '.npz')
+    if os.path.exists(path):
+        data = np.load(path)
+        ret = collections.defaultdict(dict)
+        for name in data.files:
+            kind, m = name.split(':', 1)
+            ret[m][kind] = data[name]
+        return dict(ret)
+
+    ret = analyze_replay(src, extra_items)
+    np.savez_compressed(path, **{f'{k}:{m}': grid for m, kinds in ret.items() for k, grid in kinds.items()})
+    return ret
+
+
+def build_heatmaps(root, extra_items=(), workers=WORKERS):
+    # merged {map: {kind: grid}} over the replays under root, cached per replay file
+    cache_dir = os.path.join(root, '.heatmap')
+    os.makedirs(cache_dir, exist_ok=True)
+    files = sources(root)
+
+    merged = {}
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for result in pool.map(_cached_analysis, files, [cache_dir] * len(files), [extra_items] * len(files)):
+            for m, kinds in result.items():
+                into = merged.setdefault(m, {})
+                for k, grid in kinds.items():
+                    into[k] = grid if k not in into else _merge(into[k], grid)
+    return merged
+
+
+def to_rgba(grid):
+    # log-scaled counts as a red overlay, top row first for texture upload
+    level = np.log1p(grid.astype(np.float32))
+    if level.max() > 0:
+        level /= level.max()
+    rgba = np.zeros(grid.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (1 - level) * 200
+    rgba[..., 3] = level * 180
+    return np.ascontiguousarray(np.flipud(rgba))
@@ -0,0 +1,67 @@
+class ExtraInfo:
+    def __init__(self):
+        self.__key = None
+        self.__rows = []
+
+    @staticmethod
+    def __signature(game):
+        # cheap enough for every frame: objects are only counted, the rows are rebuilt when anything is added or
+        # removed; rewinds and seeks call invalidate
+        objects = game.objects
+        player = game.player
+        weapons = player.weapons if player is not None else ()
+        gem_collection = getattr(game, 'gem_collection', None)
+        gems = getattr(gem_collection, 'gems', None)
+        return (
+            id(game), game.current_map, id(objects), len(objects), id(objects[-1]) if objects else None,
+            id(game.tiled_map), len(game.tiled_map.weapons),
+            id(weapons), len(weapons), sum(1 for w in weapons if w.equipped),
+            id(gem_collection), None if gems is None else len(gems),
+        )
+
+    @staticmethod
+    def __build(game):
+        npcs = []
+        items = []
+        gems = []
+        for o in game.objects:
+            match o.nametype:
+                case 'NPC':
+                    npcs.append(o.name)
+                case 'Item':
+                    items.append(o.display_name)
+                case 'gem':
+                    gems.append(o.name)
+
+        rows = []
+        if len(npcs) > 0:
+            rows.append('NPC({0}): {1}'.format(len(npcs), npcs))
+        if len(items) > 0:
+            rows.append('Items({0}): {1}'.format(len(items), items))
+        weapons = [o.get("type") for o in game.tiled_map.weapons]
+        if len(weapons) > 0:
+            rows.append('Weapons({0}): {1}, has: {2}, equipped: {3}'.format(
+                len(weapons),
+                weapons,
+                [w.display_name for w in game.player.weapons],
+                [w.display_name for w in filter(lambda x: x.equipped, game.player.weapons)]))
+        if hasattr(game, 'gem_collection'):
+            text = 'Gems({0}): '.format(len(gems))
+            text_parts = []
+            if hasattr(game.gem_collection, 'count_all_gems'):
+                text_parts.append('count_all_gems: {0}'.format(game.gem_collection.count_all_gems()))
+            if hasattr(game.gem_collection, 'gems'):
+                text_parts.append('len(gems) - 1(root): {0}'.format(len(game.gem_collection.gems) - 1))
+            text += ', '.join(text_parts)
+            rows.append(text)
+        return rows
+
+    def rows(self, game):
+        key = ExtraInfo.__signature(game)
+        if key != self.__key:
+            self.__rows = ExtraInfo.__build(game)
+            self.__key = key
+        return self.__rows
+
+    def invalidate(self):
+        self.__key = None
@@ -0,0 +1,260 @@
+import bisect
+import collections
+import json
+import os
+import time
+from datetime import datetime
+
+from game.engine.keys import Keys
+
+from hack.backup import GameBackup, HASH_IGNORE
+from hack.sim import Simulator
+
+SPRINT_KEYS = (Keys.A, Keys.D)
+JUMP_KEY = Keys.W
+
+
+def load_keys(path):
+    ret = []
+    with open(path, 'rb') as f:
+        for l in f:
+            ret.append(frozenset(Keys.from_serialized(k) for k in json.loads(l)['keys']))
+    return ret
+
+
+def write_messages(path, msgs):
+    with open(path, 'wb') as f:
+        for msg in msgs:
+            f.write(msg)
+            f.write(b'\n')
+
+
+class SprintOptimizer:
+    WINDOW = 8
+    JUMP_LOOKAHEAD = 4
+    # a shortened run may differ from the original only in these player attributes, everything else must match to
+    # resync; the end state must match exactly
+    MOTION = ('x', 'y', 'x_speed', 'y_speed', 'stamina')
+
+    def __init__(self, keys, extra_items=()):
+        self.keys = keys
+        self.extra_items = extra_items
+
+        self.sim = None
+        self.positions = {}
+        self.hashes = []
+        self.final = None
+        self.original = []
+        # tick the original stops being simulated at (a server wait), or None
+        self.stopped = None
+        self.ticks = 0
+
+    def __hash(self):
+        player = self.sim.game.player
+        return GameBackup.hash_snapshot(
+            GameBackup.generate_snapshot(self.sim.game), HASH_IGNORE,
+            {id(player): SprintOptimizer.MOTION} if player is not None else None)
+
+    def __exact(self):
+        return GameBackup.hash_snapshot(GameBackup.generate_snapshot(self.sim.game))
+
+    def __record_original(self):
+        # position -> original tick indices reaching it, used to find resync candidates
+        self.sim = Simulator(Simulator.new_game(self.extra_items))
+        start = GameBackup.generate_snapshot(self.sim.game)
+        self.positions = collections.defaultdict(list)
+        self.positions[self.sim.position_key()].append(0)
+        self.hashes = [self.__hash()]
+        self.original = []
+        for i, keys in enumerate(self.keys):
+            msgs = self.sim.step(keys)
+            if msgs is None:
+                self.stopped = i
+                self.keys = self.keys[:i]
+                break
+            self.original.extend(msgs)
+            self.positions[self.sim.position_key()].append(i + 1)
+            self.hashes.append(self.__hash())
+        self.final = self.__exact()
+        GameBackup.inflate_snapshot(start)
+        return start
+
+    def __variants(self, checkpoint, i):
+        base = self.keys[i:i + SprintOptimizer.WINDOW]
+        variants = [base]
+
+        GameBackup.inflate_snapshot(checkpoint)
+        player = self.sim.game.player
+        if player is not None and player.stamina > 0:
+            sprint = [k | {Keys.LSHIFT} if any(s in k for s in SPRINT_KEYS) else k for k in base]
+            if sprint != base:
+                variants.append(sprint)
+
+        ahead = self.keys[i + 1:i + 1 + SprintOptimizer.JUMP_LOOKAHEAD]
+        if base and JUMP_KEY not in base[0] and any(JUMP_KEY in k for k in ahead):
+            variants.append([base[0] | {JUMP_KEY}] + base[1:])
+        return variants
+
+    def __resync(self, i, least):
+        # the earliest original tick after i, and at least least, in the same state, so waits in the original are kept
+        indices = self.positions.get(self.sim.position_key())
+        if not indices:
+            return None
+        k = bisect.bisect_left(indices, max(i + 1, least))
+        if k == len(indices):
+            return None
+        state = self.__hash()
+        return next((j for j in indices[k:] if self.hashes[j] == state), None)
+
+    def __try(self, checkpoint, i, variant):
+        # returns (original index resynced to, ticks used, messages) with the most ticks saved
+        GameBackup.inflate_snapshot(checkpoint)
+        msgs = []
+        best = None
+        for n, keys in enumerate(variant, 1):
+            step = self.sim.step(keys)
+            if step is None:
+                break
+            msgs.extend(step)
+            # only a resync saving at least as much as the best so far is worth hashing the state for
+            j = self.__resync(i, 0 if best is None else best[0] - best[1] + n)
+            if j is not None:
+                best = j, n, len(msgs)
+        if best is None:
+            return None
+        j, n, size = best
+        return j, n, msgs[:size]
+
+    def run(self):
+        checkpoint = self.__record_original()
+
+        i = 0
+        out = []
+        ticks = 0
+        while i < len(self.keys):
+            best = None
+            for variant in self.__variants(checkpoint, i):
+                result = self.__try(checkpoint, i, variant)
+                if result is None:
+                    continue
+                if best is None or result[0] - result[1] > best[0] - best[1]:
+                    best = result + (variant,)
+            if best is None:
+                # lost sync with the original route, keep it as recorded
+                self.ticks = len(self.keys)
+                return self.original
+
+            # only the winner is snapshotted
+            i, n, msgs, variant = best
+            GameBackup.inflate_snapshot(checkpoint)
+            for keys in variant[:n]:
+                self.sim.step(keys)
+            checkpoint = GameBackup.generate_snapshot(self.sim.game)
+            out.extend(msgs)
+            ticks += n
+
+        GameBackup.inflate_snapshot(checkpoint)
+        if self.__exact() != self.final or ticks >= len(self.keys):
+            self.ticks = len(self.keys)
+            return self.original
+        self.ticks = ticks
+        return out
+
+
+class ReplayMinimizer:
+    def __init__(self, keys, extra_items=()):
+        self.keys = keys
+        self.extra_items = extra_items
+
+        self.sim = None
+        self.removed = 0
+        self.stopped = None
+        self.ticks = 0
+
+    def __hash(self):
+        return GameBackup.hash_snapshot(GameBackup.generate_snapshot(self.sim.game))
+
+    def __verify(self, keys, final):
+        # replays the kept ticks in a fresh game; only the tick counter may differ from the original end state
+        self.sim = Simulator(Simulator.new_game(self.extra_items))
+        for k in keys:
+            if self.sim.step(k) is None:
+                return False
+        return self.__hash() == final
+
+    def run(self):
+        self.sim = Simulator(Simulator.new_game(self.extra_items))
+        start = GameBackup.generate_snapshot(self.sim.game)
+
+        hashes = [self.__hash()]
+        original = []
+        for i, keys in enumerate(self.keys):
+            msgs = self.sim.step(keys)
+            if msgs is None:
+                self.stopped = i
+                self.keys = self.keys[:i]
+                break
+            original.extend(msgs)
+            hashes.append(self.__hash())
+        self.ticks = len(self.keys)
+
+        # any tick range that starts and ends in the same state is a no-op, jump to the last occurrence
+        last = {h: i for i, h in enumerate(hashes)}
+
+        GameBackup.inflate_snapshot(start)
+        out = []
+        kept = []
+        disabled = set()
+        checkpoint = None
+        i = 0
+        while i < len(self.keys):
+            j = last[hashes[i]]
+            if j > i and i not in disabled:
+                checkpoint = i, GameBackup.generate_snapshot(self.sim.game), len(out), len(kept)
+                i = j
+                continue
+
+            msgs = self.sim.step(self.keys[i])
+            i += 1
+            if msgs is None or self.__hash() != hashes[i]:
+                # the cut was not equivalent after all, undo it and keep those ticks
+                if checkpoint is None:
+                    return original
+                i, snapshot, size, ticks = checkpoint
+                checkpoint = None
+                disabled.add(i)
+                GameBackup.inflate_snapshot(snapshot)
+                del out[size:]
+                del kept[ticks:]
+                continue
+            out.extend(msgs)
+            kept.append(self.keys[i - 1])
+
+        if not self.__verify(kept, hashes[-1]):
+            return original
+        self.removed = len(original) - len(out)
+        self.ticks = len(kept)
+        return out
+
+
+def _output_path(src, tag):
+    name = os.path.basename(src).removesuffix('.jsonl')
+    return os.path.join(os.path.dirname(src), f'{name}.{tag}.{datetime.now().strftime("%d-%H-%M-%S-%f")}.jsonl')
+
+
+def _process(processor, src, tag):
+    # (output path, ticks before, ticks after, tick the simulation stopped at or None, seconds taken)
+    start = time.perf_counter()
+    before = len(processor.keys)
+    msgs = processor.run()
+    dst = _output_path(src, tag)
+    write_messages(dst, msgs)
+    return dst, before, processor.ticks, processor.stopped, time.perf_counter() - start
+
+
+def optimize_replay(src, extra_items=()):
+    return _process(SprintOptimizer(load_keys(src), extra_items), src, 'opt')
+
+
+def minimize_replay(src, extra_items=()):
+    return _process(ReplayMinimizer(load_keys(src), extra_items), src, 'min')
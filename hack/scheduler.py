@@ -0,0 +1,68 @@
+import time
+
+
+class TickScheduler:
+    FRAME_BUDGET = 1 / 60 * .8
+    TURBO_RATE = 60 * 100
+    TURBO_BUDGET = 1 / 30 * .8
+    MAX_BACKLOG = .25
+    SMOOTHING = .1
+    REPORT_EVERY = .25
+
+    def __init__(self):
+        self.frame_time = 0.
+        self.tick_cost = 0.
+        self.achieved = 0.
+        self.target = 0.
+        self.skipped_renders = 0
+        self.dropped_ticks = 0.
+
+        self.__last = None
+        self.__accumulator = 0.
+        self.__last_report = 0.
+
+    def reset(self):
+        self.__last = None
+        self.__accumulator = 0.
+
+    def __smooth(self, old, new):
+        if old == 0:
+            return new
+        return old + (new - old) * TickScheduler.SMOOTHING
+
+    def due(self, rate, budget=FRAME_BUDGET):
+        # fixed timestep: accumulate wall time, run whole ticks, never more than the frame budget affords
+        now = time.perf_counter()
+        dt = 1 / rate if self.__last is None else now - self.__last
+        self.__last = now
+        self.frame_time = self.__smooth(self.frame_time, dt)
+        self.target = rate
+
+        self.__accumulator += dt * rate
+        ticks = int(self.__accumulator)
+        if self.tick_cost > 0:
+            ticks = min(ticks, max(1, int(budget / self.tick_cost)))
+
+        backlog = rate * TickScheduler.MAX_BACKLOG
+        if self.__accumulator - ticks > backlog:
+            # too far behind to catch up smoothly, play slower instead of spiralling
+            self.dropped_ticks += self.__accumulator - ticks - backlog
+            self.__accumulator = ticks + backlog
+        self.__accumulator -= ticks
+
+        if ticks > 1:
+            self.skipped_renders += ticks - 1
+        return ticks
+
+    def ran(self, ticks, elapsed):
+        if ticks > 0:
+            self.tick_cost = self.__smooth(self.tick_cost, elapsed / ticks)
+        if self.frame_time > 0:
+            self.achieved = self.__smooth(self.achieved, ticks / self.frame_time)
+
+    def should_report(self):
+        now = time.perf_counter()
+        if now - self.__last_report < TickScheduler.REPORT_EVERY:
+            return False
+        self.__last_report = now
+        return True
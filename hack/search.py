@@ -0,0 +1,253 @@
+import functools
+import heapq
+import itertools
+import math
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+from game.engine.keys import Keys
+
+from hack.backup import GameBackup
+from hack.sim import Session, Simulator
+from hack.transposition import TranspositionTable
+
+ACTIONS = (
+    (),
+    (Keys.A,),
+    (Keys.D,),
+    (Keys.W,),
+    (Keys.A, Keys.W),
+    (Keys.D, Keys.W),
+    (Keys.A, Keys.LSHIFT),
+    (Keys.D, Keys.LSHIFT),
+    (Keys.A, Keys.W, Keys.LSHIFT),
+    (Keys.D, Keys.W, Keys.LSHIFT),
+)
+
+
+def distance_to(target):
+    def heuristic(game):
+        if game.player is None:
+            return math.inf
+        return math.hypot(game.player.x - target.x, game.player.y - target.y)
+
+    return heuristic
+
+
+def distance_to_point(game, x, y):
+    if game.player is None:
+        return math.inf
+    return math.hypot(game.player.x - x, game.player.y - y)
+
+
+def point_heuristic(x, y):
+    # picklable, unlike distance_to which closes over a live object
+    return functools.partial(distance_to_point, x=x, y=y)
+
+
+class Branch:
+    __slots__ = ('snapshot', 'parent', 'msgs', 'score')
+
+    def __init__(self, snapshot, parent, msgs, score):
+        self.snapshot = snapshot
+        self.parent = parent
+        self.msgs = msgs
+        self.score = score
+
+    def path(self):
+        chunks = []
+        branch = self
+        while branch is not None:
+            chunks.append(branch.msgs)
+            branch = branch.parent
+        return list(itertools.chain.from_iterable(reversed(chunks)))
+
+
+class Search:
+    def __init__(self, game, heuristic, goal=16, actions=ACTIONS, beam_width=16, action_repeat=6, max_depth=200,
+                 table=None, transitions=None, progress=None, cancelled=None):
+        self.game = game
+        self.heuristic = heuristic
+        self.goal = goal
+        self.actions = actions
+        self.beam_width = beam_width
+        self.action_repeat = action_repeat
+        self.max_depth = max_depth
+
+        self.sim = Simulator(game)
+        self.table = table if table is not None else TranspositionTable()
+        # (exact state, action) -> child state; outlives a search, the game being deterministic
+        self.transitions = transitions if transitions is not None else TranspositionTable()
+        self.skipped = 0
+        self.progress = progress
+        self.cancelled = cancelled
+        self.elapsed = 0.
+
+    @property
+    def ticks_per_minute(self):
+        if self.elapsed <= 0:
+            return 0.
+        return self.sim.ticks / self.elapsed * 60
+
+    def __expand(self, beam, depth):
+        # keep the best beam_width children in a max-heap on score, only snapshotting the ones that make it in
+        heap = []
+        counter = itertools.count()
+        for branch in beam:
+            # state_hash leaves out most of the game, only the exact state makes a transition safe to reuse
+            exact = GameBackup.hash_snapshot(branch.snapshot)
+            for action in self.actions:
+                # a child already known to be visited is not simulated again
+                child_state = self.transitions.get((exact, action))
+                if child_state is not None and self.table.seen(child_state, depth):
+                    self.skipped += 1
+                    continue
+
+                GameBackup.inflate_snapshot(branch.snapshot)
+                msgs = self.sim.step(action, self.action_repeat)
+                if msgs is None:
+                    continue
+
+                child_state = self.sim.state_hash()
+                self.transitions.put((exact, action), child_state)
+                if self.table.visit(child_state, depth):
+                    continue
+
+                score = self.heuristic(self.game)
+                if score <= self.goal:
+                    return Branch(None, branch, msgs, score), None
+                if len(heap) >= self.beam_width and -heap[0][0] <= score:
+                    continue
+
+                child = Branch(GameBackup.generate_snapshot(self.game), branch, msgs, score)
+                if len(heap) >= self.beam_width:
+                    heapq.heapreplace(heap, (-score, next(counter), child))
+                else:
+                    heapq.heappush(heap, (-score, next(counter), child))
+
+        return None, sorted((child for _, _, child in heap), key=lambda b: b.score)
+
+    def run(self):
+        start = time.perf_counter()
+        origin = GameBackup.generate_snapshot(self.game)
+        try:
+            beam = [Branch(origin, None, [], self.heuristic(self.game))]
+            self.table.visit(self.sim.state_hash(), 0)
+            for depth in range(1, self.max_depth + 1):
+                if self.cancelled is not None and self.cancelled.is_set():
+                    return None
+                if self.progress is not None:
+                    self.progress(depth, self.sim.ticks)
+                found, beam = self.__expand(beam, depth)
+                if found is not None:
+                    return found.path()
+                if not beam:
+                    return None
+            return None
+        finally:
+            GameBackup.inflate_snapshot(origin)
+            self.elapsed = time.perf_counter() - start
+
+
+def common_prefix(old, new):
+    # only the ticks after this are shipped to a session replica
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            return i
+    return min(len(old), len(new))
+
+
+def _search_main(extra_items, tasks, results, cancelled):
+    session = Session(extra_items)
+    transitions = TranspositionTable()
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        start, keys, position, heuristic = task
+        try:
+            refused = session.follow(start, keys, position)
+            if refused is not None:
+                results.put(('refused', refused))
+                continue
+            search = Search(
+                session.game, heuristic, transitions=transitions, cancelled=cancelled,
+                progress=lambda depth, ticks: results.put(('progress', depth, ticks)))
+            msgs = search.run()
+        except Exception:
+            results.put(('error', traceback.format_exc()))
+            return
+        results.put((
+            'done', msgs, search.sim.ticks, search.ticks_per_minute,
+            f'{search.table.stats()}, {search.skipped} known transitions skipped'))
+
+
+class SearchProcess:
+    # runs Search in one background process that keeps a replica of the session between searches
+    def __init__(self, extra_items=()):
+        self.extra_items = tuple(extra_items)
+        self.thread = None
+        self.__ctx = multiprocessing.get_context('spawn')
+        self.__cancelled = self.__ctx.Event()
+        self.__proc = None
+        self.__synced = []
+
+    @property
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def start(self, prefix, position, heuristic, on_progress, on_done):
+        # callbacks run on a background thread: on_progress(depth, ticks), on_done(msgs, cancelled, summary);
+        # position is the client's Simulator.position_key(), the replica refuses to search from anywhere else
+        assert not self.busy
+        self.__cancelled.clear()
+        self.thread = threading.Thread(
+            target=self.__run, args=(prefix, position, heuristic, on_progress, on_done), daemon=True)
+        self.thread.start()
+
+    def __sync(self, prefix):
+        start = common_prefix(self.__synced, prefix)
+        self.__synced = prefix
+        return start, prefix[start:]
+
+    def __run(self, prefix, position, heuristic, on_progress, on_done):
+        if self.__proc is None:
+            self.__tasks = self.__ctx.Queue()
+            self.__results = self.__ctx.Queue()
+            self.__proc = self.__ctx.Process(
+                target=_search_main, args=(self.extra_items, self.__tasks, self.__results, self.__cancelled),
+                daemon=True)
+            self.__proc.start()
+            self.__synced = []
+
+        start, keys = self.__sync(prefix)
+        self.__tasks.put((start, keys, position, heuristic))
+        while True:
+            try:
+                kind, *result = self.__results.get(timeout=1)
+            except queue.Empty:
+                if self.__proc.is_alive():
+                    continue
+                kind, result = 'error', [f'search process exited with {self.__proc.exitcode}']
+            match kind:
+                case 'progress':
+                    on_progress(*result)
+                case 'done':
+                    msgs, ticks, per_minute, stats = result
+                    on_done(msgs, self.__cancelled.is_set(), f'{ticks} ticks ({per_minute:.0f}/min), {stats}')
+                    return
+                case 'refused':
+                    on_done(None, False, result[0])
+                    return
+                case 'error':
+                    # the replica is in an unknown state, start over next time
+                    self.__proc.join(timeout=1)
+                    self.__proc = None
+                    on_done(None, False, result[0].strip().splitlines()[-1])
+                    return
@@ -0,0 +1,284 @@
+import collections
+import heapq
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+
+from hack.backup import GameBackup
+from hack.search import ACTIONS, common_prefix
+from hack.sim import Session, Simulator
+from hack.transposition import TranspositionTable
+
+WORKERS = int(os.environ.get('HACK_SEARCH_WORKERS', '0'))
+
+
+class _Worker:
+    CACHE_SIZE = 512
+
+    def __init__(self, extra_items, action_repeat):
+        self.action_repeat = action_repeat
+        self.heuristic = None
+
+        self.session = Session(extra_items)
+        self.game = self.session.game
+        self.sim = Simulator(self.game)
+        self.cache = collections.OrderedDict()
+        # (exact state, action) -> child state, kept between searches
+        self.transitions = TranspositionTable()
+        # state -> depth, mirroring the coordinator's table for the current search
+        self.visited = {}
+
+    def begin(self, start, keys, position, heuristic):
+        # back to the last search's root, then follow the session from the common prefix on;
+        # returns why the replica cannot search from there, or None
+        if () in self.cache:
+            GameBackup.inflate_snapshot(self.cache[()])
+        self.cache.clear()
+        refused = self.session.follow(start, keys, position)
+        if refused is not None:
+            return refused
+        self.heuristic = heuristic
+        self.visited = {}
+        self.cache[()] = GameBackup.generate_snapshot(self.game)
+        return None
+
+    def __restore(self, path):
+        snapshot = self.cache.get(path)
+        if snapshot is not None:
+            self.cache.move_to_end(path)
+            return snapshot
+
+        # re-simulate from the deepest cached ancestor
+        depth = len(path) - 1
+        while path[:depth] not in self.cache:
+            depth -= 1
+        GameBackup.inflate_snapshot(self.cache[path[:depth]])
+        for action in path[depth:]:
+            self.sim.step(ACTIONS[action], self.action_repeat)
+
+        snapshot = GameBackup.generate_snapshot(self.game)
+        self.cache[path] = snapshot
+        if len(self.cache) > _Worker.CACHE_SIZE:
+            # the root stays, the next search starts from it
+            self.cache.move_to_end(())
+            self.cache.popitem(last=False)
+        return snapshot
+
+    def expand(self, path, depth, visited):
+        # visited: what the coordinator recorded since its last task here; returns (children, skipped)
+        self.visited.update(visited)
+        base = self.__restore(path)
+        # state_hash leaves out most of the game, only the exact state makes a transition safe to reuse
+        exact = GameBackup.hash_snapshot(base)
+        children = []
+        skipped = 0
+        for action, keys in enumerate(ACTIONS):
+            child = self.transitions.get((exact, action))
+            if child is not None and self.visited.get(child, depth + 1) <= depth:
+                skipped += 1
+                continue
+            GameBackup.inflate_snapshot(base)
+            msgs = self.sim.step(keys, self.action_repeat)
+            if msgs is None:
+                continue
+            state = self.sim.state_hash()
+            self.transitions.put((exact, action), state)
+            children.append((action, self.heuristic(self.game), state, msgs))
+        return children, skipped
+
+
+def _worker_main(worker_id, tasks, results, extra_items, action_repeat):
+    try:
+        worker = _Worker(extra_items, action_repeat)
+    except Exception:
+        results.put((worker_id, None, traceback.format_exc(), 0))
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        ticks = worker.sim.ticks
+        try:
+            match task:
+                case ('begin', start, keys, position, heuristic):
+                    refused = worker.begin(start, keys, position, heuristic)
+                    results.put((worker_id, (), (refused, worker.sim.state_hash()), 0))
+                case ('expand', path, depth, visited):
+                    results.put((worker_id, path, worker.expand(path, depth, visited), worker.sim.ticks - ticks))
+        except Exception:
+            results.put((worker_id, None, traceback.format_exc(), 0))
+            return
+
+
+class SearchPool:
+    # the beam search of hack.search spread over worker processes, each keeping a replica of the session
+    def __init__(self, workers=WORKERS, extra_items=(), goal=16, beam_width=32, action_repeat=6, max_depth=200):
+        self.workers = workers or os.cpu_count()
+        self.extra_items = tuple(extra_items)
+        self.goal = goal
+        self.beam_width = beam_width
+        self.action_repeat = action_repeat
+        self.max_depth = max_depth
+
+        self.thread = None
+        self.table = TranspositionTable()
+        self.skipped = 0
+        self.ticks = 0
+        self.elapsed = 0.
+        self.expansions = [0] * self.workers
+        self.__cancelled = threading.Event()
+        self.__procs = []
+        self.__synced = []
+        self.__pending = 0
+
+    @property
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def ticks_per_minute(self):
+        if self.elapsed <= 0:
+            return 0.
+        return self.ticks / self.elapsed * 60
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def start(self, prefix, position, heuristic, on_progress, on_done):
+        # same contract as SearchProcess.start
+        assert not self.busy
+        self.__cancelled.clear()
+        self.thread = threading.Thread(
+            target=self.__run, args=(prefix, position, heuristic, on_progress, on_done), daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def __path(path, msgs):
+        return list(itertools.chain.from_iterable(msgs[path[:i]] for i in range(1, len(path) + 1)))
+
+    def assign(self, beam, owner):
+        # even shares first; a path stays with the worker holding its parent's checkpoint while that one has room
+        share = -(-len(beam) // self.workers)
+        load = [0] * self.workers
+        for path in beam:
+            worker_id = owner.get(path)
+            if worker_id is None or load[worker_id] >= share:
+                worker_id = min(range(self.workers), key=load.__getitem__)
+            load[worker_id] += 1
+            yield worker_id, path
+
+    def __receive(self, results):
+        while True:
+            try:
+                worker_id, path, children, ticks = results.get(timeout=1)
+            except queue.Empty:
+                if all(proc.is_alive() for proc in self.__procs):
+                    continue
+                raise RuntimeError('a search worker exited')
+            if path is None:
+                raise RuntimeError(children)
+            self.__pending -= 1
+            return worker_id, path, children, ticks
+
+    def search(self, tasks, results, on_progress=None, root=None):
+        owner = {}
+        msgs = {}
+        self.table.visit(root, 0)
+        # every state the table records, each worker is sent what it has not seen yet
+        visited = [(root, 0)]
+        sent = [0] * self.workers
+        beam = [()]
+        for depth in range(1, self.max_depth + 1):
+            if self.__cancelled.is_set():
+                return None
+            if on_progress is not None:
+                on_progress(depth, self.ticks)
+            for worker_id, path in self.assign(beam, owner):
+                self.expansions[worker_id] += 1
+                self.__pending += 1
+                tasks[worker_id].put(('expand', path, depth, visited[sent[worker_id]:]))
+                sent[worker_id] = len(visited)
+
+            candidates = []
+            owner = {}
+            for _ in range(len(beam)):
+                worker_id, path, (children, skipped), ticks = self.__receive(results)
+                self.ticks += ticks
+                self.skipped += skipped
+                for action, score, state, child_msgs in children:
+                    if self.table.visit(state, depth):
+                        continue
+                    visited.append((state, depth))
+                    child = path + (action,)
+                    msgs[child] = child_msgs
+                    owner[child] = worker_id
+                    if score <= self.goal:
+                        return SearchPool.__path(child, msgs)
+                    candidates.append((score, child))
+
+            if not candidates:
+                return None
+            beam = [child for _, child in heapq.nsmallest(self.beam_width, candidates)]
+        return None
+
+    def __spawn(self):
+        ctx = multiprocessing.get_context('spawn')
+        self.__results = ctx.Queue()
+        self.__tasks = [ctx.Queue() for _ in range(self.workers)]
+        self.__procs = [
+            ctx.Process(
+                target=_worker_main, args=(i, self.__tasks[i], self.__results, self.extra_items, self.action_repeat),
+                daemon=True)
+            for i in range(self.workers)
+        ]
+        for proc in self.__procs:
+            proc.start()
+        self.__synced = []
+        self.__pending = 0
+
+    def __shutdown(self):
+        for proc in self.__procs:
+            proc.terminate()
+        self.__procs = []
+
+    def __run(self, prefix, position, heuristic, on_progress, on_done):
+        try:
+            if not self.__procs:
+                self.__spawn()
+            # expansions still in flight when the last search stopped early
+            while self.__pending:
+                self.__receive(self.__results)
+            # the session prefix is shipped once; later searches only send what changed
+            start = common_prefix(self.__synced, prefix)
+            self.__synced = prefix
+            for task in self.__tasks:
+                self.__pending += 1
+                task.put(('begin', start, prefix[start:], position, heuristic))
+            # every replica reports the same root state, or refuses the same way
+            refused = root = None
+            for _ in self.__procs:
+                refused, root = self.__receive(self.__results)[2]
+            if refused is not None:
+                on_done(None, False, refused)
+                return
+
+            self.table = TranspositionTable()
+            self.skipped = 0
+            self.ticks = 0
+            self.expansions = [0] * self.workers
+            begin = time.perf_counter()
+            msgs = self.search(self.__tasks, self.__results, on_progress, root)
+            self.elapsed = time.perf_counter() - begin
+        except Exception as e:
+            # the replicas are in an unknown state, start over next time
+            self.__shutdown()
+            on_done(None, False, str(e).strip().splitlines()[-1])
+            return
+        on_done(msgs, self.__cancelled.is_set(), (
+            f'{self.ticks} ticks ({self.ticks_per_minute:.0f}/min) on {self.workers} workers, '
+            f'expansions {self.expansions}, {self.table.stats()}, {self.skipped} known transitions skipped'))
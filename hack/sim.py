@@ -0,0 +1,130 @@
+import hashlib
+
+import game.venator
+import game.components.items
+from game.engine.keys import Keys
+
+from hack.backup import GameBackup
+
+
+def add_extra_items(venator, extra_items):
+    for d in extra_items:
+        if not any([i["display_name"] == d for i in venator.items]):
+            it = game.components.items.Item(None, game.components.items.display_to_name(d), d)
+            it.collected_time = 1
+            venator.items.append(it)
+
+
+class CaptureNet:
+    def __init__(self):
+        self.msgs = []
+
+    def send_one(self, msg):
+        self.msgs.append(msg)
+
+
+class Simulator:
+    def __init__(self, game):
+        self.game = game
+        self.net = CaptureNet()
+        self.ticks = 0
+
+    @staticmethod
+    def new_game(extra_items=()):
+        venator = game.venator.Venator(None)
+        add_extra_items(venator, extra_items)
+        return venator
+
+    def waiting_server(self):
+        return self.game.waiting_for_server_txt or self.game.module_reloading
+
+    def step(self, keys, repeat=1):
+        # returns the messages the game would have sent, or None if it stopped to wait for the server
+        venator = self.game
+        net_old = venator.net
+        venator.net = self.net
+        try:
+            for _ in range(repeat):
+                if not venator.map_loaded:
+                    venator.map_loaded = True
+                    venator.setup()
+                venator.raw_pressed_keys = set(keys)
+                venator.tick()
+                self.ticks += 1
+                if self.waiting_server():
+                    self.net.msgs.clear()
+                    return None
+        finally:
+            venator.net = net_old
+
+        msgs, self.net.msgs = self.net.msgs, []
+        return msgs
+
+    def state_hash(self, snapshot=None):
+        # coarse player-based hash unless a snapshot is given to hash exactly
+        if snapshot is not None:
+            return GameBackup.hash_snapshot(snapshot)
+        return hashlib.blake2b(repr(self.state_key()).encode(), digest_size=8).digest()
+
+    def position_key(self):
+        player = self.game.player
+        if player is None:
+            return self.game.current_map, None
+        return self.game.current_map, round(player.x), round(player.y)
+
+    def state_key(self):
+        player = self.game.player
+        if player is None:
+            return self.game.current_map, None
+        return (
+            self.game.current_map,
+            round(player.x), round(player.y),
+            getattr(player, 'x_speed', None), getattr(player, 'y_speed', None),
+        )
+
+
+class Session:
+    # a headless replica of the client session for a worker process, following its key prefix incrementally
+    CHECKPOINT_EVERY = 600
+    CHECKPOINTS = 8
+
+    def __init__(self, extra_items=()):
+        self.game = Simulator.new_game(extra_items)
+        self.sim = Simulator(self.game)
+        self.keys = []
+        # the last key ran into a server wait, which a replica cannot get past
+        self.waiting = False
+        self.__checkpoints = {0: GameBackup.generate_snapshot(self.game)}
+
+    def sync(self, start, keys):
+        # keys replace the prefix from tick start on; only what changed since the last sync is simulated.
+        # False if the prefix reaches a server wait
+        if start < len(self.keys):
+            tick = max(t for t in self.__checkpoints if t <= start)
+            for t in [t for t in self.__checkpoints if t > tick]:
+                del self.__checkpoints[t]
+            GameBackup.inflate_snapshot(self.__checkpoints[tick])
+            keys = self.keys[tick:start] + list(keys)
+            del self.keys[tick:]
+            self.waiting = False
+        elif self.waiting:
+            return False
+
+        for k in keys:
+            self.keys.append(k)
+            if self.sim.step([Keys.from_serialized(x) for x in k]) is None:
+                self.waiting = True
+                return False
+            if len(self.keys) % Session.CHECKPOINT_EVERY == 0:
+                self.__checkpoints[len(self.keys)] = GameBackup.generate_snapshot(self.game)
+                if len(self.__checkpoints) > Session.CHECKPOINTS + 1:
+                    del self.__checkpoints[min(t for t in self.__checkpoints if t)]
+        return True
+
+    def follow(self, start, keys, position):
+        # None if the replica ends up where the client is, otherwise why it cannot plan from there
+        if not self.sync(start, keys):
+            return f'cannot plan past the server wait at tick {len(self.keys)}'
+        if self.sim.position_key() != position:
+            return 'the replica does not match the client (restored by the server?)'
+        return None
@@ -0,0 +1,87 @@
+import gc
+import time
+
+
+class SnapshotGC:
+    FREEZE_EVERY = 60
+    # unfreeze once this share of the frozen snapshots is gone, for the game garbage frozen along with them
+    UNFREEZE_SHARE = .5
+    # snapshot nodes torn down per tick and per idle frame
+    TEARDOWN_TICK = 5000
+    TEARDOWN_IDLE = 100000
+    # the full collection after an unfreeze only runs once the game has been idle this long
+    COLLECT_IDLE = .5
+
+    def __init__(self):
+        self.last_pause = 0.
+        self.max_pause = 0.
+        self.__pause_start = None
+        self.__captured = 0
+        self.__live = 0
+        self.__frozen = 0
+        self.__frozen_gone = 0
+        self.__graveyard = []
+        self.__collect = False
+        self.__idle_since = None
+
+        gc.callbacks.append(self.__callback)
+
+    def __callback(self, phase, info):
+        if phase == 'start':
+            self.__pause_start = time.perf_counter()
+        elif self.__pause_start is not None:
+            self.last_pause = time.perf_counter() - self.__pause_start
+            self.max_pause = max(self.max_pause, self.last_pause)
+            self.__pause_start = None
+
+    def captured(self):
+        # move the rewind history into the permanent generation so collections stop rescanning it
+        self.__live += 1
+        self.__captured += 1
+        if self.__captured >= SnapshotGC.FREEZE_EVERY:
+            self.__captured = 0
+            gc.collect(1)
+            gc.freeze()
+            self.__frozen = self.__live
+
+    def released(self, snapshots, oldest=False):
+        # dropped snapshots are torn down a few nodes per tick instead of waiting for a full collection
+        snapshots = [s for s in snapshots if s is not None]
+        self.__graveyard.extend(snapshots)
+        count = len(snapshots)
+        if oldest:
+            gone = min(count, self.__frozen)
+        else:
+            gone = max(0, self.__frozen - (self.__live - count))
+        self.__live -= count
+        self.__captured = min(self.__captured, self.__live)
+        self.__frozen -= gone
+        self.__frozen_gone += gone
+        if self.__frozen_gone and self.__frozen_gone >= SnapshotGC.UNFREEZE_SHARE * (self.__frozen + self.__frozen_gone):
+            self.__collect = True
+
+    def __teardown(self, budget):
+        if self.__graveyard:
+            # imported late: hack.backup pulls in game modules before the hooks are injected
+            from hack.backup import GameBackup
+            GameBackup.teardown(self.__graveyard, budget)
+
+    def tick(self):
+        self.__idle_since = None
+        self.__teardown(SnapshotGC.TEARDOWN_TICK)
+
+    def idle(self):
+        now = time.perf_counter()
+        if self.__idle_since is None:
+            self.__idle_since = now
+        self.__teardown(SnapshotGC.TEARDOWN_IDLE)
+        if self.__collect and not self.__graveyard and now - self.__idle_since >= SnapshotGC.COLLECT_IDLE:
+            self.__collect = False
+            gc.unfreeze()
+            gc.collect()
+            gc.freeze()
+            self.__frozen = self.__live
+            self.__frozen_gone = 0
+
+    def stats(self):
+        return self.last_pause * 1000, self.max_pause * 1000
@@ -0,0 +1,151 @@
+import argparse
+import heapq
+import itertools
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+
+
+def echo_state(msg):
+    return {'state': msg.get('state')}
+
+
+class EchoServer(socketserver.ThreadingTCPServer):
+    # echoes each newline-delimited JSON message back with latency, for benchmarking the submitter against a socket.
+    # Not a game server: it does not speak the game's protocol and the client cannot connect to it
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0., jitter=0., respond=echo_state):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.respond = respond
+        self.received = 0
+
+    def delay(self):
+        return self.latency + random.uniform(0, self.jitter)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server: EchoServer = self.server
+        pending = []
+        counter = itertools.count()
+        cond = threading.Condition()
+        closed = False
+
+        def reply():
+            # replies leave in order, each no earlier than its own latency
+            while True:
+                with cond:
+                    cond.wait_for(lambda: pending or closed)
+                    if not pending:
+                        return
+                    due, _, data = pending[0]
+                    now = time.monotonic()
+                    if due > now:
+                        cond.wait(due - now)
+                        continue
+                    heapq.heappop(pending)
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except OSError:
+                    return
+
+        sender = threading.Thread(target=reply, daemon=True)
+        sender.start()
+
+        last_due = 0.
+        for line in self.rfile:
+            server.received += 1
+            response = server.respond(json.loads(line))
+            if response is None:
+                continue
+            last_due = max(last_due, time.monotonic() + server.delay())
+            with cond:
+                heapq.heappush(pending, (last_due, next(counter), json.dumps(response).encode() + b'\n'))
+                cond.notify()
+
+        with cond:
+            closed = True
+            cond.notify()
+        sender.join()
+
+
+class EchoNet:
+    def __init__(self, address):
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile('rb')
+
+    def send_one(self, msg):
+        self.sock.sendall(msg + b'\n')
+
+    def recv_one(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        return line.rstrip(b'\n')
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def benchmark(msgs, latency, jitter):
+    if __package__:
+        from hack.submit import Submitter
+    else:
+        from submit import Submitter
+
+    server = EchoServer(latency=latency, jitter=jitter).start()
+    net = EchoNet(server.server_address)
+    submitter = Submitter(net)
+
+    start = time.perf_counter()
+    submitter.submit(msgs)
+    blocked = time.perf_counter() - start
+    submitter.drain()
+    sent = time.perf_counter() - start
+
+    # until the echo of the last message arrives, roughly what a waiting-for-server stall adds
+    for _ in msgs:
+        net.recv_one()
+    synced = time.perf_counter() - start
+
+    print(f'{len(msgs)} messages, latency {latency * 1e3:.0f}ms, jitter {jitter * 1e3:.0f}ms')
+    print(f'game thread blocked {blocked * 1e3:.1f}ms')
+    print(f'sent in {sent * 1e3:.1f}ms ({len(msgs) / sent:.0f} msg/s)')
+    print(f'last echo after {synced * 1e3:.1f}ms ({(synced - sent) * 1e3:.1f}ms after the last send)')
+
+    net.close()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the submitter against a local echo socket with latency')
+    parser.add_argument('replay', nargs='?', help='.jsonl file to submit, generated messages otherwise')
+    parser.add_argument('--latency', type=float, default=0., help='ms')
+    parser.add_argument('--jitter', type=float, default=0., help='ms')
+    parser.add_argument('--count', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.replay:
+        with open(args.replay, 'rb') as f:
+            msgs = [l.rstrip(b'\n') for l in f]
+    else:
+        msgs = [json.dumps({'keys': [], 'state': i}).encode() for i in range(args.count)]
+    benchmark(msgs, args.latency / 1e3, args.jitter / 1e3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import collections
+import socket
+import threading
+import time
+
+
+class Submitter:
+    BATCH = 64
+    # submit blocks while this many messages are still unsent
+    MAX_QUEUED = 16384
+    DRAIN_TIMEOUT = 5.
+
+    def __init__(self, net):
+        self.net = net
+        self.sent = 0
+        self.total = 0
+        self.error = None
+
+        self.__queue = collections.deque()
+        self.__closed = False
+        self.__cond = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    @property
+    def busy(self):
+        return self.sent < self.total
+
+    def submit(self, msgs):
+        msgs = collections.deque(msgs)
+        with self.__cond:
+            while msgs:
+                self.__cond.wait_for(
+                    lambda: len(self.__queue) < Submitter.MAX_QUEUED or self.error is not None or self.__closed)
+                if self.error is not None or self.__closed:
+                    return
+                for _ in range(min(Submitter.MAX_QUEUED - len(self.__queue), len(msgs))):
+                    self.__queue.append(msgs.popleft())
+                    self.total += 1
+                self.__cond.notify_all()
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        with self.__cond:
+            return self.__cond.wait_for(lambda: not self.busy or self.error is not None, timeout)
+
+    def close(self, timeout=DRAIN_TIMEOUT):
+        # returns how many messages were dropped unsent
+        self.drain(timeout)
+        with self.__cond:
+            self.__closed = True
+            dropped = len(self.__queue)
+            self.__queue.clear()
+            self.__cond.notify_all()
+        self.__thread.join(timeout)
+        return dropped
+
+    def __socket(self):
+        sock = getattr(self.net, 'sock', None) or getattr(self.net, 'socket', None)
+        return sock if isinstance(sock, socket.socket) else None
+
+    def __send(self, batch):
+        # corked, the batch leaves in full segments instead of one packet per message, whatever the framing
+        sock = self.__socket()
+        if sock is None or not hasattr(socket, 'TCP_CORK'):
+            for msg in batch:
+                self.net.send_one(msg)
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        try:
+            for msg in batch:
+                self.net.send_one(msg)
+        finally:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__queue or self.__closed)
+                if self.__closed:
+                    return
+                batch = [self.__queue.popleft() for _ in range(min(Submitter.BATCH, len(self.__queue)))]
+                self.__cond.notify_all()
+
+            try:
+                self.__send(batch)
+            except Exception as e:
+                with self.__cond:
+                    self.error = e
+                    self.__cond.notify_all()
+                return
+
+            with self.__cond:
+                self.sent += len(batch)
+                self.__cond.notify_all()
+            # let the game and render threads have the GIL between batches
+            time.sleep(0)
+
+
+class StandInNet:
+    def __init__(self, send_cost=0.0002):
+        self.send_cost = send_cost
+        self.received = []
+
+    def send_one(self, msg):
+        time.sleep(self.send_cost)
+        self.received.append(msg)
+
+
+def benchmark(count=5000, send_cost=0.0002):
+    msgs = [b'{"keys": [], "state": %d}' % i for i in range(count)]
+
+    net = StandInNet(send_cost)
+    start = time.perf_counter()
+    for msg in msgs:
+        net.send_one(msg)
+    inline = time.perf_counter() - start
+
+    net = StandInNet(send_cost)
+    submitter = Submitter(net)
+    start = time.perf_counter()
+    submitter.submit(msgs)
+    blocked = time.perf_counter() - start
+    submitter.drain()
+    total = time.perf_counter() - start
+    assert net.received == msgs
+
+    print(f'{count} messages, {send_cost * 1e6:.0f}us per send')
+    print(f'inline:    game thread blocked {inline * 1e3:.1f}ms, {count / inline:.0f} msg/s')
+    print(f'submitter: game thread blocked {blocked * 1e3:.1f}ms, {count / total:.0f} msg/s')
+
+
+if __name__ == '__main__':
+    benchmark()
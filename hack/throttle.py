@@ -0,0 +1,46 @@
+import os
+import time
+
+
+class RenderThrottle:
+    # frame caps for when nothing needs a full-rate redraw; unpaused play, held keys and fresh input are never capped
+    IDLE_FPS = 15
+    PAUSED_FPS = 30
+    DRAG_FPS = 120
+    DRAG_HOLD = .1
+    ENABLED = not os.environ.get('HACK_NO_THROTTLE')
+
+    def __init__(self):
+        self.__key = None
+        self.__last = 0.
+        self.__drag_until = 0.
+        self.__input = False
+
+    def input(self):
+        # the frame after an input event is drawn without waiting
+        self.__input = True
+
+    def dragged(self):
+        self.__drag_until = time.perf_counter() + RenderThrottle.DRAG_HOLD
+
+    def wait(self, key, paused, held=False):
+        # key covers everything that changes the picture while the game itself stands still;
+        # draw() also drives tick(), so held keys (rewinding with Z/X while paused) run at full rate
+        now = time.perf_counter()
+        if held or self.__input:
+            fps = None
+        elif not paused:
+            fps = RenderThrottle.DRAG_FPS if now < self.__drag_until else None
+        elif key == self.__key and now >= self.__drag_until:
+            fps = RenderThrottle.IDLE_FPS
+        else:
+            fps = RenderThrottle.PAUSED_FPS
+        self.__key = key
+        self.__input = False
+
+        if fps is not None and RenderThrottle.ENABLED:
+            delay = self.__last + 1 / fps - now
+            if delay > 0:
+                time.sleep(delay)
+                now = time.perf_counter()
+        self.__last = now
@@ -0,0 +1,157 @@
+import collections
+import operator
+
+import numpy as np
+
+ATTRS = ('x', 'y', 'health', 'stamina', 'usage_count', 'cool_down_timer')
+
+OPS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+
+def _number(v):
+    if isinstance(v, (int, float)):
+        return float(v)
+    return np.nan
+
+
+def _entities(game):
+    # keyed by label and rank among entities with that label, which survives rewinds and reused ids
+    ranks = collections.Counter()
+
+    def keyed(label, obj):
+        ranks[label] += 1
+        return (label, ranks[label]), label, obj
+
+    player = game.player
+    if player is not None:
+        yield keyed('player', player)
+        for w in player.weapons:
+            yield keyed(f'weapon:{w.display_name}', w)
+    for o in game.objects:
+        if o is not player:
+            yield keyed(f'{o.nametype}:{getattr(o, "name", None) or type(o).__name__}', o)
+
+
+class TickIndex:
+    # one (tick, entity) float column per attribute, NaN where an entity has no value
+    def __init__(self, attrs=ATTRS):
+        self.attrs = attrs
+        self.length = 0
+        self.entities = {}
+        self.labels = []
+        self.maps = []
+        self.__map = np.full(256, -1, dtype=np.int32)
+        self.__columns = {a: np.full((256, 16), np.nan) for a in attrs}
+
+    def __reserve(self, ticks, entities):
+        rows, cols = next(iter(self.__columns.values())).shape
+        if ticks <= rows and entities <= cols:
+            return
+        while rows < ticks:
+            rows *= 2
+        while cols < entities:
+            cols *= 2
+        for a, old in self.__columns.items():
+            new = np.full((rows, cols), np.nan)
+            new[:old.shape[0], :old.shape[1]] = old
+            self.__columns[a] = new
+        self.__map = np.concatenate((self.__map, np.full(rows - len(self.__map), -1, dtype=np.int32)))
+
+    def clear(self):
+        self.length = 0
+        self.entities.clear()
+        self.labels.clear()
+        self.maps.clear()
+        for col in self.__columns.values():
+            col.fill(np.nan)
+
+    def record(self, tick, game):
+        # recording a tick drops everything after it, like the sim buffer does
+        idx = []
+        objs = []
+        for key, label, obj in _entities(game):
+            if key not in self.entities:
+                self.entities[key] = len(self.labels)
+                self.labels.append(label)
+            idx.append(self.entities[key])
+            objs.append(obj)
+
+        if game.current_map not in self.maps:
+            self.maps.append(game.current_map)
+
+        self.__reserve(tick + 1, len(self.labels))
+        self.__map[tick] = self.maps.index(game.current_map)
+        for a, col in self.__columns.items():
+            col[min(tick, self.length):tick + 1] = np.nan
+            col[tick, idx] = [_number(getattr(o, a, None)) for o in objs]
+        self.length = tick + 1
+
+    def drop_front(self, ticks):
+        ticks = min(ticks, self.length)
+        for col in self.__columns.values():
+            col[:self.length - ticks] = col[ticks:self.length]
+        self.__map[:self.length - ticks] = self.__map[ticks:self.length]
+        self.length -= ticks
+
+    def match(self, text):
+        idx = [i for i, label in enumerate(self.labels) if text in label]
+        if not idx:
+            raise ValueError(f'no entity matches {text!r}')
+        return idx
+
+    def series(self, attr, text):
+        if attr not in self.__columns:
+            raise ValueError(f'{attr!r} is not indexed')
+        return self.__columns[attr][:self.length, self.match(text)]
+
+    def trajectory(self, label='player', start=0, end=None):
+        # map names, per-tick map ids and (x, y) positions of one entity
+        if label not in self.labels:
+            raise ValueError(f'{label!r} was never recorded')
+        i = self.labels.index(label)
+        end = self.length if end is None else min(end, self.length)
+        points = np.stack((self.__columns['x'][start:end, i], self.__columns['y'][start:end, i]), axis=1)
+        return list(self.maps), self.__map[start:end].copy(), points.astype(np.float32)
+
+    def near(self, a, b, radius):
+        dx = self.series('x', a)[:, :, None] - self.series('x', b)[:, None, :]
+        dy = self.series('y', a)[:, :, None] - self.series('y', b)[:, None, :]
+        with np.errstate(invalid='ignore'):
+            return np.flatnonzero((np.hypot(dx, dy) <= radius).any(axis=(1, 2)))
+
+    def changed(self, attr, text):
+        v = self.series(attr, text)
+        prev, cur = v[:-1], v[1:]
+        diff = (cur != prev) & ~(np.isnan(cur) & np.isnan(prev))
+        return np.flatnonzero(diff.any(axis=1)) + 1
+
+    def where(self, attr, text, op, value):
+        with np.errstate(invalid='ignore'):
+            return np.flatnonzero(OPS[op](self.series(attr, text), value).any(axis=1))
+
+    def query(self, text):
+        # near <entity> <entity> <radius> | changed <attr> <entity> | <attr> <entity> <op> <value>
+        match text.split():
+            case ['near', a, b, radius]:
+                return self.near(a, b, float(radius))
+            case ['changed', attr, entity]:
+                return self.changed(attr, entity)
+            case [attr, entity, op, value] if op in OPS:
+                return self.where(attr, entity, op, float(value))
+        raise ValueError(f'cannot parse query {text!r}')
+
+    @staticmethod
+    def ranges(ticks):
+        if len(ticks) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(ticks) != 1)
+        starts = np.concatenate(([ticks[0]], ticks[breaks + 1]))
+        ends = np.concatenate((ticks[breaks], [ticks[-1]]))
+        return list(zip(starts.tolist(), ends.tolist()))
@@ -2,7 +2,6 @@ import os
 import glob
 
 from PySide6 import QtWidgets, QtGui, QtCore
-from PySide6.QtCore import QMetaObject
 
 DEFAULT_SPEED = 1.5
 
@@ -33,6 +32,12 @@ class PlayTextWidget(QtWidgets.QWidget):
 
         layout.addStretch()
 
+        self.rate = QtWidgets.QLabel(self)
+        layout.addWidget(self.rate)
+
+        self.gc = QtWidgets.QLabel(self)
+        layout.addWidget(self.gc)
+
         # sim mode
         self.sim_mode = QtWidgets.QCheckBox('Sim Mode', self)
         layout.addWidget(self.sim_mode)
@@ -44,11 +49,39 @@ class PlayTextWidget(QtWidgets.QWidget):
             self.sim_mode.setDisabled(index > 0)
             self.counter.setText(f'Tick: {subed + index}/{subed + unsubed} ({index}/{unsubed})')
 
+    def set_rate(self, achieved, target, skipped):
+        self.rate.setText(f'{achieved:.0f}/{target:.0f} tps ({skipped} skipped)')
+
+    def set_gc(self, last_ms, max_ms):
+        self.gc.setText(f'GC: {last_ms:.1f}ms (max {max_ms:.1f}ms)')
+
+
+class TimelineSlider(QtWidgets.QSlider):
+    seek = QtCore.Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(QtCore.Qt.Orientation.Horizontal, parent)
+
+        self.setRange(0, 0)
+        self.setDisabled(True)
+        self.actionTriggered.connect(lambda _: self.seek.emit(self.sliderPosition()))
+
+    def set_position(self, index, total):
+        if self.isSliderDown():
+            return
+        self.blockSignals(True)
+        self.setRange(0, total)
+        self.setValue(index)
+        self.blockSignals(False)
+        self.setDisabled(total == 0)
+
 
 class PlayWidget(QtWidgets.QWidget):
     state: str = None
 
     stopReplay = QtCore.Signal()
+    # play/pause clicked, with the new state
+    switched = QtCore.Signal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -70,6 +103,10 @@ class PlayWidget(QtWidgets.QWidget):
         layout.addWidget(self.speed)
         self.speed.valueChanged.connect(self.set_speed)
 
+        # turbo: as many ticks as fit in a frame
+        self.turbo = QtWidgets.QCheckBox('Turbo', self)
+        layout.addWidget(self.turbo)
+
         # play button
         self.play_button = QtWidgets.QPushButton(self)
         layout.addWidget(self.play_button)
@@ -87,8 +124,10 @@ class PlayWidget(QtWidgets.QWidget):
         match self.state:
             case 'play':
                 self.set_state('pause')
+                self.switched.emit('pause')
             case 'pause':
                 self.set_state('play')
+                self.switched.emit('play')
             case 'replay':
                 self.stopReplay.emit()
             case _:
@@ -151,6 +190,22 @@ class ReplayButtonsWidget(QtWidgets.QWidget):
         self.btn2 = QtWidgets.QPushButton('Replay (Direct)', self)
         layout.addWidget(self.btn2)
 
+        # offline sprint optimizer
+        self.optimize = QtWidgets.QPushButton('Optimize', self)
+        layout.addWidget(self.optimize)
+
+        # offline idle/loop trimming
+        self.minimize = QtWidgets.QPushButton('Trim', self)
+        layout.addWidget(self.minimize)
+
+        # replay the newest previous autosave
+        self.resume = QtWidgets.QPushButton('Resume', self)
+        layout.addWidget(self.resume)
+
+        # ghost path overlay
+        self.ghost = QtWidgets.QPushButton('Ghost', self)
+        layout.addWidget(self.ghost)
+
     def set_total(self, total):
         if total < 0:
             self.total.clear()
@@ -213,10 +268,69 @@ class ReplayWidget(QtWidgets.QWidget):
         self.list.addItems(fls)
 
 
+class QueryWidget(QtWidgets.QWidget):
+    jump = QtCore.Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        layout = QtWidgets.QVBoxLayout()
+        self.setLayout(layout)
+
+        self.input = QtWidgets.QLineEdit(self)
+        self.input.setPlaceholderText('near player Portal 50 | changed usage_count Portal | health player < 3')
+        layout.addWidget(self.input)
+
+        self.results = QtWidgets.QListWidget(self)
+        layout.addWidget(self.results)
+
+        self.results.itemClicked.connect(
+            lambda item: self.jump.emit(item.data(QtCore.Qt.ItemDataRole.UserRole)))
+
+    def set_results(self, ranges):
+        self.results.clear()
+        for start, end in ranges:
+            item = QtWidgets.QListWidgetItem(f'Tick {start}' if start == end else f'Tick {start}-{end}')
+            item.setData(QtCore.Qt.ItemDataRole.UserRole, start)
+            self.results.addItem(item)
+
+
+class HeatmapWidget(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        layout = QtWidgets.QHBoxLayout()
+        self.setLayout(layout)
+
+        self.kind = QtWidgets.QComboBox(self)
+        self.kind.addItems(['Heatmap off', 'player', 'enemy', 'hit', 'death'])
+        layout.addWidget(self.kind)
+
+        # headless analytics over every saved replay
+        self.build = QtWidgets.QPushButton('Build Heatmap', self)
+        layout.addWidget(self.build)
+
+
+class DiffWidget(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        layout = QtWidgets.QVBoxLayout()
+        self.setLayout(layout)
+
+        self.button = QtWidgets.QPushButton('Diff With Previous Tick', self)
+        layout.addWidget(self.button)
+
+        self.results = QtWidgets.QListWidget(self)
+        layout.addWidget(self.results)
+
+    def set_rows(self, rows):
+        self.results.clear()
+        self.results.addItems(rows)
+
+
 class ToolboxWidget(QtWidgets.QWidget):
     def __init__(self):
-        self.__shown = False
-
         super().__init__()
         self.unfocus_func = None
 
@@ -228,6 +342,10 @@ class ToolboxWidget(QtWidgets.QWidget):
         self.counter = PlayTextWidget(self)
         layout.addWidget(self.counter)
 
+        # sim timeline
+        self.timeline = TimelineSlider(self)
+        layout.addWidget(self.timeline)
+
         # play button area
         self.play = PlayWidget(self)
         layout.addWidget(self.play)
@@ -236,10 +354,26 @@ class ToolboxWidget(QtWidgets.QWidget):
         self.replay = ReplayWidget(self)
         layout.addWidget(self.replay)
 
+        # replay analytics
+        self.heatmap = HeatmapWidget(self)
+        layout.addWidget(self.heatmap)
+
+        # sim history query
+        self.query = QueryWidget(self)
+        layout.addWidget(self.query)
+
+        # snapshot diff inspector
+        self.diff = DiffWidget(self)
+        layout.addWidget(self.diff)
+
         # save area
         self.save = SaveWidget(self)
         layout.addWidget(self.save)
 
+        # status line
+        self.status = QtWidgets.QLabel(self)
+        layout.addWidget(self.status)
+
         WT = QtCore.Qt.WindowType
         self.setWindowFlags(
             WT.NoDropShadowWindowHint |
@@ -250,6 +384,13 @@ class ToolboxWidget(QtWidgets.QWidget):
         )
         self.setWindowTitle('\U0001f4a6 Blue Water Hacking Toolbox')
 
+    def set_tick(self, subed, index=None, unsubed=None):
+        self.counter.set_tick(subed, index, unsubed)
+        if index is None:
+            self.timeline.set_position(0, 0)
+        else:
+            self.timeline.set_position(index, unsubed)
+
     @QtCore.Slot()
     def showInit(self):
         self.show()
@@ -259,8 +400,3 @@ class ToolboxWidget(QtWidgets.QWidget):
         if self.unfocus_func is not None:
             self.unfocus_func()
         super().leaveEvent(event)
-
-    def show_async(self):
-        if not self.__shown:
-            QMetaObject.invokeMethod(self, 'showInit')
-            self.__shown = True
@@ -0,0 +1,64 @@
+import collections
+import os
+import sys
+
+DEFAULT_MAX_BYTES = int(os.environ.get('HACK_TT_MB', '256')) * 1024 * 1024
+
+
+class TranspositionTable:
+    ENTRY_OVERHEAD = 96
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.__table = collections.OrderedDict()
+        self.__bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__table)
+
+    @property
+    def size(self):
+        return self.__bytes
+
+    @staticmethod
+    def __entry_size(key, value):
+        return sys.getsizeof(key) + sys.getsizeof(value) + TranspositionTable.ENTRY_OVERHEAD
+
+    def get(self, key, default=None):
+        if key in self.__table:
+            self.__table.move_to_end(key)
+            return self.__table[key]
+        return default
+
+    def put(self, key, value):
+        old = self.__table.pop(key, None)
+        if old is not None:
+            self.__bytes -= TranspositionTable.__entry_size(key, old)
+        self.__table[key] = value
+        self.__bytes += TranspositionTable.__entry_size(key, value)
+
+        while self.__bytes > self.max_bytes and len(self.__table) > 1:
+            k, v = self.__table.popitem(last=False)
+            self.__bytes -= TranspositionTable.__entry_size(k, v)
+            self.evictions += 1
+
+    def seen(self, key, depth):
+        # true if the state was already reached at the same or a smaller depth
+        best = self.get(key)
+        return best is not None and best <= depth
+
+    def visit(self, key, depth):
+        # like seen, but records the state when it is new
+        if self.seen(key, depth):
+            self.hits += 1
+            return True
+        self.misses += 1
+        self.put(key, depth)
+        return False
+
+    def stats(self):
+        return f'TT {self.hits} hits/{self.misses} misses, {len(self)} states, {self.__bytes / 1024 / 1024:.1f}MB'
@@ -26,31 +26,79 @@ struct _PyInterpreterFrame {
     PyObject *localsplus[1];
 };
 
-static void
+static inline int
+is_immutable(PyObject *const obj) {
+    return obj == Py_None || PyLong_Check(obj) || PyFloat_Check(obj) || PyUnicode_Check(obj) ||
+           PyBytes_Check(obj) || PyComplex_Check(obj) || PyRange_Check(obj) || PyType_Check(obj);
+}
+
+static inline PyObject *
+call_slot(PyObject *const func, PyObject *const obj) {
+    if (is_immutable(obj)) {
+        Py_INCREF(obj);
+        return obj;
+    }
+    return PyObject_CallOneArg(func, obj);
+}
+
+#ifndef FRAME_COMPLETED
+#define FRAME_COMPLETED 1
+#endif
+#ifndef FRAME_CLEARED
+#define FRAME_CLEARED 4
+#endif
+
+static int
 PyFrame_Copy(struct _PyInterpreterFrame *const src, struct _PyInterpreterFrame *dest, PyObject *const backupFunc) {
     assert(src->previous == NULL);
     const int stacktop = src->stacktop;
     assert(stacktop >= src->f_code->co_nlocalsplus);
     memmove(dest, src, sizeof(PyObject *) * stacktop + sizeof(struct _PyInterpreterFrame));
+    Py_XINCREF(dest->f_code);
+    Py_XINCREF(dest->f_funcobj);
+    dest->f_locals = NULL;
     for (int off = 0; off < stacktop; ++off) {
         if (dest->localsplus[off] != NULL) {
-            dest->localsplus[off] = PyObject_CallOneArg(backupFunc, dest->localsplus[off]);
+            dest->localsplus[off] = call_slot(backupFunc, dest->localsplus[off]);
+            if (dest->localsplus[off] == NULL) {
+                /* the slots not reached yet are still borrowed from src */
+                memset(dest->localsplus + off, 0, sizeof(PyObject *) * (stacktop - off));
+                return -1;
+            }
         }
     }
 
-    if (dest->f_locals != NULL)
-        dest->f_locals = PyObject_CallOneArg(backupFunc, dest->f_locals);
-    Py_XINCREF(dest->f_code);
-    Py_XINCREF(dest->f_funcobj);
+    if (src->f_locals != NULL && (dest->f_locals = call_slot(backupFunc, src->f_locals)) == NULL)
+        return -1;
+    return 0;
 }
 
-static PyObject *backup(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
-    if (nargs != 2 || !PyGen_CheckExact(args[0]) || !PyCallable_Check(args[1])) {
-        PyErr_SetString(PyExc_ValueError, "expects (<generator>, <callable>)");
-        return NULL;
+static int
+PyFrame_Inflate(struct _PyInterpreterFrame *const f, PyObject *const inflateFunc) {
+    const int stacktop = f->stacktop;
+    assert(stacktop >= f->f_code->co_nlocalsplus);
+    for (int off = 0; off < stacktop; ++off) {
+        PyObject *const old = f->localsplus[off];
+        if (old != NULL && !is_immutable(old)) {
+            PyObject *const new = PyObject_CallOneArg(inflateFunc, old);
+            if (new == NULL)
+                return -1;
+            f->localsplus[off] = new;
+            Py_DECREF(old);
+        }
     }
+    PyObject *const old = f->f_locals;
+    if (old != NULL && !is_immutable(old)) {
+        PyObject *const new = PyObject_CallOneArg(inflateFunc, old);
+        if (new == NULL)
+            return -1;
+        f->f_locals = new;
+        Py_DECREF(old);
+    }
+    return 0;
+}
 
-    PyGenObject *const g = (PyGenObject *) args[0];
+static PyObject *backup_one(PyGenObject *const g, PyObject *const backupFunc) {
     assert(g->gi_weakreflist == NULL);
     assert(g->gi_origin_or_finalizer == NULL);
     assert(g->gi_exc_state.exc_value == NULL);
@@ -61,7 +109,8 @@ static PyObject *backup(PyObject *const self, PyObject *const *args, Py_ssize_t
 
     int size = iframe->f_code->co_nlocalsplus + iframe->f_code->co_stacksize;
     PyGenObject *gen = PyObject_GC_NewVar(PyGenObject, &PyGen_Type, size);
-    assert(gen != NULL);
+    if (gen == NULL)
+        return NULL;
 
     gen->gi_weakreflist = NULL;
     Py_XINCREF(gen->gi_name = g->gi_name);
@@ -74,12 +123,66 @@ static PyObject *backup(PyObject *const self, PyObject *const *args, Py_ssize_t
     gen->gi_running_async = g->gi_running_async;
     gen->gi_frame_state = g->gi_frame_state;
 
-    PyFrame_Copy(iframe, (struct _PyInterpreterFrame *) gen->gi_iframe, args[1]);
+    const int ret = PyFrame_Copy(iframe, (struct _PyInterpreterFrame *) gen->gi_iframe, backupFunc);
 
     PyObject_GC_Track(gen);
+    if (ret < 0) {
+        /* completed, so dealloc only releases the partial copy instead of closing it */
+        gen->gi_frame_state = FRAME_COMPLETED;
+        Py_DECREF(gen);
+        return NULL;
+    }
     return (PyObject *) gen;
 }
 
+static PyObject *backup(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
+    if (nargs != 2 || !PyGen_CheckExact(args[0]) || !PyCallable_Check(args[1])) {
+        PyErr_SetString(PyExc_ValueError, "expects (<generator>, <callable>)");
+        return NULL;
+    }
+
+    return backup_one((PyGenObject *) args[0], args[1]);
+}
+
+static PyObject *backup_many(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
+    if (nargs != 2 || !PyCallable_Check(args[1])) {
+        PyErr_SetString(PyExc_ValueError, "expects (<sequence of generators>, <callable>)");
+        return NULL;
+    }
+
+    PyObject *const seq = PySequence_Fast(args[0], "expects (<sequence of generators>, <callable>)");
+    if (seq == NULL)
+        return NULL;
+
+    const Py_ssize_t n = PySequence_Fast_GET_SIZE(seq);
+    PyObject *const *const items = PySequence_Fast_ITEMS(seq);
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        if (!PyGen_CheckExact(items[i])) {
+            Py_DECREF(seq);
+            PyErr_SetString(PyExc_ValueError, "expects (<sequence of generators>, <callable>)");
+            return NULL;
+        }
+    }
+
+    PyObject *const ret = PyList_New(n);
+    if (ret == NULL) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        PyObject *const back = backup_one((PyGenObject *) items[i], args[1]);
+        if (back == NULL) {
+            Py_DECREF(ret);
+            Py_DECREF(seq);
+            return NULL;
+        }
+        PyList_SET_ITEM(ret, i, back);
+    }
+
+    Py_DECREF(seq);
+    return ret;
+}
+
 static PyObject *inflate(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
     if (nargs != 2 || !PyGen_CheckExact(args[0]) || !PyCallable_Check(args[1])) {
         PyErr_SetString(PyExc_ValueError, "expects (<generator>, <callable>)");
@@ -87,24 +190,337 @@ static PyObject *inflate(PyObject *const self, PyObject *const *args, Py_ssize_t
     }
 
     PyGenObject *const g = (PyGenObject *) args[0];
-    struct _PyInterpreterFrame *f = (struct _PyInterpreterFrame *) g->gi_iframe;
+    if (PyFrame_Inflate((struct _PyInterpreterFrame *) g->gi_iframe, args[1]) < 0)
+        return NULL;
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *inflate_many(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
+    if (nargs != 2 || !PyCallable_Check(args[1])) {
+        PyErr_SetString(PyExc_ValueError, "expects (<sequence of generators>, <callable>)");
+        return NULL;
+    }
 
+    PyObject *const seq = PySequence_Fast(args[0], "expects (<sequence of generators>, <callable>)");
+    if (seq == NULL)
+        return NULL;
+
+    const Py_ssize_t n = PySequence_Fast_GET_SIZE(seq);
+    PyObject *const *const items = PySequence_Fast_ITEMS(seq);
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        if (!PyGen_CheckExact(items[i])) {
+            Py_DECREF(seq);
+            PyErr_SetString(PyExc_ValueError, "expects (<sequence of generators>, <callable>)");
+            return NULL;
+        }
+    }
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        PyGenObject *const g = (PyGenObject *) items[i];
+        if (PyFrame_Inflate((struct _PyInterpreterFrame *) g->gi_iframe, args[1]) < 0) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+    }
+
+    Py_DECREF(seq);
+    Py_RETURN_NONE;
+}
+
+static PyObject *frame(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
+    if (nargs != 2 || !PyGen_CheckExact(args[0])) {
+        PyErr_SetString(PyExc_ValueError, "expects (<generator>, <unbound marker>)");
+        return NULL;
+    }
+
+    /* read straight from the interpreter frame, so no frame object is ever attached to a backup */
+    PyGenObject *const g = (PyGenObject *) args[0];
+    if (g->gi_frame_state >= FRAME_CLEARED)
+        return Py_BuildValue("(iiN)", g->gi_frame_state, -1, PyTuple_New(0));
+
+    struct _PyInterpreterFrame *const f = (struct _PyInterpreterFrame *) g->gi_iframe;
     const int stacktop = f->stacktop;
-    assert(stacktop >= f->f_code->co_nlocalsplus);
+    PyObject *const slots = PyTuple_New(stacktop);
+    if (slots == NULL)
+        return NULL;
     for (int off = 0; off < stacktop; ++off) {
-        if (f->localsplus[off] != NULL) {
-            f->localsplus[off] = PyObject_CallOneArg(args[1], f->localsplus[off]);
-        }
+        PyObject *const v = f->localsplus[off] != NULL ? f->localsplus[off] : args[1];
+        Py_INCREF(v);
+        PyTuple_SET_ITEM(slots, off, v);
     }
-    if (f->f_locals != NULL)
-        f->f_locals = PyObject_CallOneArg(args[1], f->f_locals);
+    return Py_BuildValue("(iiN)", g->gi_frame_state, (int) (f->prev_instr - _PyCode_CODE(f->f_code)), slots);
+}
+
+/* native snapshot walker, mirrors GameBackup.__generate_snapshot */
+
+static PyObject *walk_deep_copyable_cls = NULL;
+static PyObject *walk_ndarray_cls = NULL;
+static PyObject *walk_skip_cls = NULL;
+static PyObject *walk_primitive_cls = NULL;
+static PyObject *walk_container_cls = NULL;
+static PyObject *walk_venator_cls = NULL;
+static PyObject *walk_no_record = NULL;
+static PyObject *walk_container_node = NULL;
+static PyObject *walk_object_node = NULL;
+static PyObject *walk_generator_node = NULL;
+static PyObject *walk_deepcopy = NULL;
+static PyObject *walk_ndarray_copy = NULL;
+
+static PyObject *str_cls = NULL;
+static PyObject *str_copy = NULL;
+static PyObject *str_inst = NULL;
+static PyObject *str_attr = NULL;
+static PyObject *str_dunder = NULL;
 
+static PyObject *configure(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
+    if (nargs != 12) {
+        PyErr_SetString(PyExc_ValueError,
+                        "expects (<deep copyable>, <ndarray>, <skip>, <primitive>, <container>, <venator>, "
+                        "<no record>, <Container>, <Object>, <Generator>, <deepcopy>, <ndarray copy>)");
+        return NULL;
+    }
+    PyObject **const slots[] = {
+        &walk_deep_copyable_cls, &walk_ndarray_cls, &walk_skip_cls, &walk_primitive_cls, &walk_container_cls,
+        &walk_venator_cls, &walk_no_record, &walk_container_node, &walk_object_node, &walk_generator_node,
+        &walk_deepcopy, &walk_ndarray_copy,
+    };
+    for (Py_ssize_t i = 0; i < nargs; ++i) {
+        Py_INCREF(args[i]);
+        Py_XSETREF(*slots[i], args[i]);
+    }
     Py_RETURN_NONE;
 }
 
+static PyObject *walk(PyObject *obj, PyObject *storage, PyObject *generators);
+
+static PyObject *walk_node(PyObject *const node_cls, PyObject *const key, PyObject *const storage) {
+    PyObject *const node = PyObject_CallNoArgs(node_cls);
+    if (node == NULL)
+        return NULL;
+    if (PyDict_SetItem(storage, key, node) < 0) {
+        Py_DECREF(node);
+        return NULL;
+    }
+    return node;
+}
+
+static PyObject *walk_container(PyObject *const obj, PyObject *const key, PyObject *const storage,
+                                PyObject *const generators) {
+    PyObject *const node = walk_node(walk_container_node, key, storage);
+    if (node == NULL)
+        return NULL;
+    if (PyObject_SetAttr(node, str_inst, obj) < 0 || PyObject_SetAttr(node, str_cls, (PyObject *) Py_TYPE(obj)) < 0)
+        goto error;
+
+    PyObject *const items = PySequence_List(obj);
+    if (items == NULL)
+        goto error;
+    const Py_ssize_t n = PyList_GET_SIZE(items);
+    PyObject *const copy = PyTuple_New(n);
+    if (copy == NULL) {
+        Py_DECREF(items);
+        goto error;
+    }
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        PyObject *const ele = walk(PyList_GET_ITEM(items, i), storage, generators);
+        if (ele == NULL) {
+            Py_DECREF(copy);
+            Py_DECREF(items);
+            goto error;
+        }
+        PyTuple_SET_ITEM(copy, i, ele);
+    }
+    Py_DECREF(items);
+
+    const int ret = PyObject_SetAttr(node, str_copy, copy);
+    Py_DECREF(copy);
+    if (ret < 0)
+        goto error;
+    return node;
+
+error:
+    Py_DECREF(node);
+    return NULL;
+}
+
+static PyObject *walk_dict(PyObject *const obj, PyObject *const key, PyObject *const storage,
+                           PyObject *const generators) {
+    PyObject *const d = PyDict_New();
+    if (d == NULL)
+        return NULL;
+    if (PyDict_SetItem(storage, key, d) < 0)
+        goto error;
+
+    PyObject *const items = PyDict_Items(obj);
+    if (items == NULL)
+        goto error;
+    const Py_ssize_t n = PyList_GET_SIZE(items);
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        PyObject *const item = PyList_GET_ITEM(items, i);
+        PyObject *const v = walk(PyTuple_GET_ITEM(item, 1), storage, generators);
+        if (v == NULL || PyDict_SetItem(d, PyTuple_GET_ITEM(item, 0), v) < 0) {
+            Py_XDECREF(v);
+            Py_DECREF(items);
+            goto error;
+        }
+        Py_DECREF(v);
+    }
+    Py_DECREF(items);
+    return d;
+
+error:
+    Py_DECREF(d);
+    return NULL;
+}
+
+static PyObject *walk_object(PyObject *const obj, PyObject *const key, PyObject *const storage,
+                             PyObject *const generators) {
+    if (!PyObject_HasAttrString(obj, "__dict__")) {
+        PyErr_Format(PyExc_AssertionError, "cannot snapshot %R", (PyObject *) Py_TYPE(obj));
+        return NULL;
+    }
+
+    PyObject *const node = walk_node(walk_object_node, key, storage);
+    if (node == NULL)
+        return NULL;
+    PyObject *const attr = PyDict_New();
+    if (attr == NULL)
+        goto error;
+    if (PyObject_SetAttr(node, str_inst, obj) < 0 || PyObject_SetAttr(node, str_attr, attr) < 0) {
+        Py_DECREF(attr);
+        goto error;
+    }
+    Py_DECREF(attr);
+
+    const int is_venator = PyObject_IsInstance(obj, walk_venator_cls);
+    if (is_venator < 0)
+        goto error;
+
+    PyObject *const names = PyObject_Dir(obj);
+    if (names == NULL)
+        goto error;
+    const Py_ssize_t n = PyList_GET_SIZE(names);
+    for (Py_ssize_t i = 0; i < n; ++i) {
+        PyObject *const k = PyList_GET_ITEM(names, i);
+        if (PyUnicode_Tailmatch(k, str_dunder, 0, 2, -1) > 0)
+            continue;
+        if (is_venator) {
+            const int skip = PySequence_Contains(walk_no_record, k);
+            if (skip < 0)
+                goto error_names;
+            if (skip)
+                continue;
+        }
+        PyObject *const v = PyObject_GetAttr(obj, k);
+        if (v == NULL)
+            goto error_names;
+        if (PyCallable_Check(v)) {
+            Py_DECREF(v);
+            continue;
+        }
+        PyObject *const snap = walk(v, storage, generators);
+        Py_DECREF(v);
+        if (snap == NULL || PyDict_SetItem(attr, k, snap) < 0) {
+            Py_XDECREF(snap);
+            goto error_names;
+        }
+        Py_DECREF(snap);
+    }
+    Py_DECREF(names);
+    return node;
+
+error_names:
+    Py_DECREF(names);
+error:
+    Py_DECREF(node);
+    return NULL;
+}
+
+static PyObject *walk_classified(PyObject *const obj, PyObject *const storage, PyObject *const generators) {
+    int r;
+    if ((r = PyObject_IsInstance(obj, walk_deep_copyable_cls)) != 0)
+        return r < 0 ? NULL : PyObject_CallOneArg(walk_deepcopy, obj);
+    if ((r = PyObject_IsInstance(obj, walk_ndarray_cls)) != 0)
+        return r < 0 ? NULL : PyObject_CallOneArg(walk_ndarray_copy, obj);
+    if ((r = PyObject_IsInstance(obj, walk_skip_cls)) != 0 || (r = PyObject_IsInstance(obj, walk_primitive_cls)) != 0) {
+        if (r < 0)
+            return NULL;
+        Py_INCREF(obj);
+        return obj;
+    }
+
+    PyObject *const key = PyLong_FromVoidPtr(obj);
+    if (key == NULL)
+        return NULL;
+    PyObject *ret = PyDict_GetItemWithError(storage, key);
+    if (ret != NULL) {
+        Py_INCREF(ret);
+        goto done;
+    }
+    if (PyErr_Occurred())
+        goto done;
+
+    if (PyGen_Check(obj)) {
+        ret = walk_node(walk_generator_node, key, storage);
+        if (ret != NULL) {
+            PyObject *const pending = PyTuple_Pack(2, ret, obj);
+            if (pending == NULL || PyList_Append(generators, pending) < 0)
+                Py_CLEAR(ret);
+            Py_XDECREF(pending);
+        }
+        goto done;
+    }
+
+    if ((r = PyObject_IsInstance(obj, walk_container_cls)) != 0) {
+        ret = r < 0 ? NULL : walk_container(obj, key, storage, generators);
+        goto done;
+    }
+
+    if (PyDict_Check(obj)) {
+        ret = walk_dict(obj, key, storage, generators);
+        goto done;
+    }
+
+    ret = walk_object(obj, key, storage, generators);
+
+done:
+    Py_DECREF(key);
+    return ret;
+}
+
+static PyObject *walk(PyObject *const obj, PyObject *const storage, PyObject *const generators) {
+    if (is_immutable(obj)) {
+        Py_INCREF(obj);
+        return obj;
+    }
+    if (Py_EnterRecursiveCall(" while generating a snapshot"))
+        return NULL;
+    PyObject *const ret = walk_classified(obj, storage, generators);
+    Py_LeaveRecursiveCall();
+    return ret;
+}
+
+static PyObject *snapshot(PyObject *const self, PyObject *const *args, Py_ssize_t nargs) {
+    if (nargs != 3 || !PyDict_CheckExact(args[1]) || !PyList_CheckExact(args[2])) {
+        PyErr_SetString(PyExc_ValueError, "expects (<object>, <dict>, <list>)");
+        return NULL;
+    }
+    if (walk_object_node == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "snapshot walker is not configured");
+        return NULL;
+    }
+
+    return walk(args[0], args[1], args[2]);
+}
+
 static PyMethodDef MyMethods[] = {
     {"backup",  (PyCFunction) backup,  METH_FASTCALL, "Function that backs up your generator."},
     {"inflate", (PyCFunction) inflate, METH_FASTCALL, "Function that inflates the backup."},
+    {"backup_many",  (PyCFunction) backup_many,  METH_FASTCALL, "Function that backs up a batch of generators."},
+    {"inflate_many", (PyCFunction) inflate_many, METH_FASTCALL, "Function that inflates a batch of backups."},
+    {"frame", (PyCFunction) frame, METH_FASTCALL, "Function that reads the frame state, resume point and slots of a generator."},
+    {"configure", (PyCFunction) configure, METH_FASTCALL, "Function that sets up the snapshot walker."},
+    {"snapshot",  (PyCFunction) snapshot,  METH_FASTCALL, "Function that walks an object graph into a snapshot."},
     {NULL, NULL, 0, NULL}
 };
 
@@ -117,5 +533,11 @@ static struct PyModuleDef hacks = {
 };
 
 PyMODINIT_FUNC PyInit_generator_hack(void) {
+    if ((str_cls = PyUnicode_InternFromString("cls")) == NULL ||
+        (str_copy = PyUnicode_InternFromString("copy")) == NULL ||
+        (str_inst = PyUnicode_InternFromString("inst")) == NULL ||
+        (str_attr = PyUnicode_InternFromString("attr")) == NULL ||
+        (str_dunder = PyUnicode_InternFromString("__")) == NULL)
+        return NULL;
     return PyModule_Create(&hacks);
 }
\ No newline at end of file
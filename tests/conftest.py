@@ -0,0 +1,15 @@
+class Node:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def method(self):
+        pass
+
+
+def counter(owner, step):
+    total = 0
+    seen = []
+    while True:
+        total += step
+        seen.append(owner)
+        yield total
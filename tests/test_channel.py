@@ -0,0 +1,37 @@
+from hack.channel import UpdateChannel
+
+
+class Target:
+    def __init__(self):
+        self.calls = []
+
+    def step(self, n):
+        self.calls.append(('step', n))
+
+    def set_text(self, text):
+        self.calls.append(('text', text))
+
+
+def test_actions_are_kept_and_setters_coalesce_in_order():
+    channel = UpdateChannel()
+    channel.set('set_text', 'a')
+    channel.post('step', 1)
+    channel.post('step', 1)
+    channel.set('set_text', 'b')
+    channel.post('step', -1)
+    target = Target()
+    channel.drain(target)
+    assert target.calls == [('text', 'b'), ('step', 1), ('step', 1), ('step', -1)]
+
+    channel.set('set_text', 'c')
+    channel.drain(target)
+    assert target.calls[-1] == ('text', 'c')
+
+
+def test_disabled_channel_keeps_nothing():
+    channel = UpdateChannel(enabled=False)
+    channel.set('set_text', 'a')
+    channel.post('step', 1)
+    target = Target()
+    channel.drain(target)
+    assert target.calls == []
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('generator_hack')
+pytest.importorskip('game')
+
+from hack.backup import Container, GameBackup, Object
+
+from conftest import Node, counter
+
+
+def test_set_order_does_not_change_the_hash():
+    a, b = Node(v=1), Node(v=2)
+    snapshot = GameBackup.generate_snapshot(Node(s={a, b}))
+    members = snapshot.attr['s']
+    # the same set walked in the other order, with a reference to a member after it
+    reordered = Container()
+    reordered.inst, reordered.cls, reordered.copy = members.inst, members.cls, members.copy[::-1]
+    other = Object()
+    other.inst, other.attr = snapshot.inst, dict(snapshot.attr, s=reordered)
+    snapshot.attr['after'] = other.attr['after'] = members.copy[0]
+    assert GameBackup.hash_snapshot(snapshot) == GameBackup.hash_snapshot(other)
+
+
+def test_generator_locals_change_the_hash():
+    root = Node()
+    root.gen = counter(root, 1)
+    next(root.gen)
+    before = GameBackup.hash_snapshot(GameBackup.generate_snapshot(root))
+    next(root.gen)
+    assert GameBackup.hash_snapshot(GameBackup.generate_snapshot(root)) != before
+
+
+def test_unchanged_set_of_tuples_has_no_diff():
+    root = Node(cells={(1, 2), (3, 4)}, objects={Node()})
+    assert GameBackup.diff_snapshots(GameBackup.generate_snapshot(root), GameBackup.generate_snapshot(root)) == []
+
+
+def test_ignore_on_leaves_out_attributes_of_one_object_only():
+    player, enemy = Node(x=1), Node(x=1)
+    root = Node(player=player, enemy=enemy)
+    before = GameBackup.hash_snapshot(GameBackup.generate_snapshot(root), ignore_on={id(player): ('x',)})
+    player.x = 2
+    assert GameBackup.hash_snapshot(GameBackup.generate_snapshot(root), ignore_on={id(player): ('x',)}) == before
+    enemy.x = 2
+    assert GameBackup.hash_snapshot(GameBackup.generate_snapshot(root), ignore_on={id(player): ('x',)}) != before
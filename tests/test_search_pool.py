@@ -0,0 +1,65 @@
+import queue
+
+import pytest
+
+pytest.importorskip('game')
+
+from hack.search import ACTIONS, point_heuristic
+from hack.search_pool import SearchPool, _Worker
+from hack.sim import Simulator
+from hack.transposition import TranspositionTable
+
+
+def state(path):
+    # action 0 stands still
+    return tuple(action for action in path if action)
+
+
+class FakeWorker:
+    # expands paths in-process, never getting close enough to the goal
+    def __init__(self, worker_id, results):
+        self.worker_id = worker_id
+        self.results = results
+
+    def put(self, task):
+        _, path, depth, visited = task
+        children = [(action, 100 + action, state(path + (action,)), [action]) for action in range(len(ACTIONS))]
+        self.results.put((self.worker_id, path, (children, 0), len(children)))
+
+
+def search(pool):
+    results = queue.Queue()
+    tasks = [FakeWorker(i, results) for i in range(pool.workers)]
+    pool.table = TranspositionTable()
+    pool.expansions = [0] * pool.workers
+    assert pool.search(tasks, results, root=()) is None
+
+
+@pytest.mark.parametrize('workers', [2, 3, 4, 8])
+def test_every_worker_gets_a_share(workers):
+    pool = SearchPool(workers=workers, max_depth=6)
+    search(pool)
+    # the root goes to one worker, then every depth is split evenly
+    assert sum(pool.expansions) == 1 + (len(ACTIONS) - 1) + 32 * 4
+    assert min(pool.expansions) > 0
+    assert max(pool.expansions) - min(pool.expansions) <= 6
+
+
+def test_assign_keeps_affinity_within_share():
+    pool = SearchPool(workers=2)
+    beam = [(0,), (1,), (2,), (3,)]
+    owner = {path: 0 for path in beam}
+    assert [worker_id for worker_id, _ in pool.assign(beam, owner)] == [0, 0, 1, 1]
+
+
+def test_known_transitions_are_not_expanded_again():
+    worker = _Worker((), action_repeat=1)
+    position = Simulator(worker.game).position_key()
+    worker.begin(0, [], position, point_heuristic(0, 0))
+    children, skipped = worker.expand((), 1, [])
+    assert skipped == 0
+
+    # the next search from the same state, with every child already visited
+    worker.begin(0, [], position, point_heuristic(0, 0))
+    children, skipped = worker.expand((), 1, [(state, 1) for _, _, state, _ in children])
+    assert skipped == len(ACTIONS) and not children
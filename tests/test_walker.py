@@ -0,0 +1,139 @@
+import collections
+import enum
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+generator_hack = pytest.importorskip('generator_hack')
+pytest.importorskip('game')
+
+from hack.backup import GameBackup, NATIVE_WALKER
+
+from conftest import Node, counter
+
+pytestmark = pytest.mark.skipif(not NATIVE_WALKER, reason='native walker not built or disabled')
+
+
+class Color(enum.Enum):
+    RED = 1
+
+
+def both(obj):
+    native = GameBackup.generate_snapshot(obj, native=True)
+    python = GameBackup.generate_snapshot(obj, native=False)
+    GameBackup.assert_same_snapshot(python, native)
+    return native, python
+
+
+def delegating(inner):
+    prefix = yield 'start'
+    yield from inner
+    yield prefix
+
+
+def test_primitives_and_containers():
+    root = Node(
+        i=1, f=1.5, s='text', b=b'bytes', none=None, t=(1, 'a', (2,)), l=[1, [2, [3]]],
+        d={'a': 1, 2: [3]}, dq=collections.deque([1, 2], maxlen=4), fs=frozenset({1, 2}),
+        e=Color.RED, r=random.Random(7), it=iter(range(5)), flag=np.bool_(True))
+    both(root)
+
+
+def test_cycles_and_shared_references():
+    root = Node()
+    child = Node(parent=root)
+    shared = [child]
+    root.self = root
+    root.child = child
+    root.a = shared
+    root.b = shared
+    root.loop = [root]
+    root.loop.append(root.loop)
+    root.d = {'root': root, 'shared': shared}
+    native, python = both(root)
+    assert native.attr['a'] is native.attr['b']
+    assert native.attr['self'] is native
+    assert native.attr['loop'].copy[1] is native.attr['loop']
+
+
+def test_sets():
+    a, b, c = Node(v=1), Node(v=2), Node(v=3)
+    root = Node(objects={a, b, c}, numbers={1, 2, 3}, nested=[{a}, frozenset({b, 'x'})])
+    a.peers = root.objects
+    both(root)
+
+
+def test_numpy_arrays():
+    arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+    root = Node(arr=arr, same=arr, view=arr[1:], empty=np.zeros(0), grid=[np.ones((2, 2), dtype=np.int8)])
+    native, python = both(root)
+    assert np.array_equal(native.attr['arr'], arr)
+    assert native.attr['arr'] is not arr
+
+
+def test_generators():
+    root = Node()
+    root.created = counter(root, 1)
+    root.running = counter(root, 2)
+    next(root.running)
+    next(root.running)
+    root.alias = root.running
+    inner = counter(Node(tag='inner'), 3)
+    root.outer = delegating(inner)
+    next(root.outer)
+    root.outer.send('prefix')
+    native, python = both(root)
+    assert native.attr['alias'] is native.attr['running']
+
+
+def test_generators_diverge():
+    root = Node()
+    root.gen = counter(root, 1)
+    next(root.gen)
+    before = GameBackup.generate_snapshot(root, native=False)
+    next(root.gen)
+    after = GameBackup.generate_snapshot(root, native=True)
+    with pytest.raises(AssertionError):
+        GameBackup.assert_same_snapshot(before, after)
+
+
+def test_round_trip():
+    root = Node(items=[1, 2], seen={1}, arr=np.zeros(3))
+    root.gen = counter(root, 5)
+    next(root.gen)
+    snapshot = GameBackup.generate_snapshot(root, native=True)
+
+    root.items.append(3)
+    root.seen.add(2)
+    root.arr[0] = 1
+    next(root.gen)
+    next(root.gen)
+
+    restored = GameBackup.inflate_snapshot(snapshot)
+    assert restored is root
+    assert root.items == [1, 2] and root.seen == {1} and not root.arr.any()
+    assert next(root.gen) == 10
+
+
+def test_restore_twice():
+    root = Node()
+    root.gen = counter(root, 1)
+    next(root.gen)
+    snapshot = GameBackup.generate_snapshot(root)
+    results = []
+    for _ in range(2):
+        GameBackup.inflate_snapshot(snapshot)
+        results.append((next(root.gen), next(root.gen)))
+    assert results == [(2, 3), (2, 3)]
+
+
+def test_restore_twice_copies_leaves():
+    root = Node(rng=random.Random(7), arr=np.zeros(3))
+    snapshot = GameBackup.generate_snapshot(root)
+    results = []
+    for _ in range(2):
+        GameBackup.inflate_snapshot(snapshot)
+        results.append((root.rng.random(), root.arr.tolist()))
+        root.arr[0] = 1
+    assert results[0] == results[1]